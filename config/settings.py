@@ -91,6 +91,9 @@ REST_FRAMEWORK = {
 # OpenAI配置
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 
+# 零知识证明密钥
+ZKP_SECRET = os.getenv('ZKP_SECRET', 'your-secret-key')
+
 # AI训练平台配置
 AI_TRAINING_PLATFORM_URL = os.getenv('AI_TRAINING_PLATFORM_URL', default='http://localhost:8000')
 AI_TRAINING_PLATFORM_API_KEY = os.getenv('AI_TRAINING_PLATFORM_API_KEY', default='')
@@ -99,6 +102,31 @@ MIN_DATASET_QUALITY_SCORE = float(os.getenv('MIN_DATASET_QUALITY_SCORE', default
 # 数据集存储配置
 DATASET_STORAGE_PATH = os.getenv('DATASET_STORAGE_PATH', default=os.path.join(BASE_DIR, 'datasets'))
 
+# 缓存配置
+# 持久缓存放在仓库之外的用户缓存目录，FileBasedCache以0700权限创建各自的子目录
+CACHE_DIR = os.getenv('CACHE_DIR', default=os.path.join(os.path.expanduser('~'), '.cache', 'datacon'))
+
+# GKR验证输入数组的缓存目录，与数据集文件分开存放，可随时清空；目录须仅限运行服务的用户访问
+VERIFICATION_CACHE_DIR = os.getenv('VERIFICATION_CACHE_DIR', default=os.path.join(CACHE_DIR, 'verification'))
+
+# default保持Django默认的进程内缓存；binance专用于Binance接口响应，默认写入磁盘以便重启后复用，
+# 部署多个worker时可通过BINANCE_CACHE_BACKEND/BINANCE_CACHE_LOCATION指向Redis以便共享
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'binance': {
+        'BACKEND': os.getenv('BINANCE_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('BINANCE_CACHE_LOCATION', default=os.path.join(CACHE_DIR, 'binance')),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # quality缓存质量评估结果，写入磁盘以便重启后及同一主机上的多个worker复用
+    'quality': {
+        'BACKEND': os.getenv('QUALITY_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('QUALITY_CACHE_LOCATION', default=os.path.join(CACHE_DIR, 'quality')),
+    }
+}
+
 # 国际化
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
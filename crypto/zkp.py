@@ -15,6 +15,7 @@ class ZKPProtocol:
     
     def __init__(self, secret: bytes):
         self.secret = secret
+        self._secret_value = int.from_bytes(secret, 'big')  # 密钥对应的整数只计算一次
         self.g = self._generate_generator()
         
     def _generate_generator(self) -> int:
@@ -75,7 +76,7 @@ class ZKPProtocol:
         """计算响应"""
         # 将challenge转换为数字
         c = int(challenge[:8], 16)
-        response = (r + c * int.from_bytes(self.secret, 'big')) % 2**32
+        response = (r + c * self._secret_value) % 2**32
         return str(response)
         
     def _verify_response(self, proof: ZKProof) -> bool:
@@ -63,9 +63,9 @@ class DataProcessor:
         """去除异常值"""
         numeric_columns = df.select_dtypes(include=['int64', 'float64']).columns
         for col in numeric_columns:
-            # 使用IQR方法去除异常值
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
+            # 使用IQR方法去除异常值，两个四分位数在一次quantile调用中求出
+            # （各列依次过滤，分位数需基于上一列过滤后的数据，不能整表一次计算）
+            Q1, Q3 = df[col].quantile([0.25, 0.75])
             IQR = Q3 - Q1
             df = df[~((df[col] < (Q1 - 1.5 * IQR)) | (df[col] > (Q3 + 1.5 * IQR)))]
         
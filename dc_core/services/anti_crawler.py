@@ -1,27 +1,67 @@
 import random
+import re
 import time
 import json
 import aiohttp
 import asyncio
 import logging
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 from fake_useragent import UserAgent
 import redis
 from datetime import datetime, timedelta
+from functools import lru_cache
+from urllib.parse import urlsplit
 import requests
-from bs4 import BeautifulSoup
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+# 代理列表页中同一行内的IP和端口单元格
+PROXY_ROW_PATTERN = re.compile(
+    r'<td[^>]*data-title="IP"[^>]*>\s*([\d.]+)\s*</td>'
+    r'(?:(?!</tr>).)*?'
+    r'<td[^>]*data-title="PORT"[^>]*>\s*(\d+)\s*</td>',
+    re.S
+)
+
+@lru_cache(maxsize=4096)
+def _extract_domain(url: str) -> str:
+    """解析URL的主机名，忽略认证信息和端口"""
+    return urlsplit(url).hostname or ''
+
+def _create_redis_client(redis_url: str, connection_pool: Optional[redis.ConnectionPool] = None) -> redis.Redis:
+    """创建Redis客户端，优先复用共享连接池"""
+    if connection_pool is not None:
+        return redis.Redis(connection_pool=connection_pool)
+    return redis.from_url(redis_url)
+
 class ProxyPool:
     """代理池管理"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
-        self.redis_client = redis.from_url(redis_url)
+    # 在一次往返内完成分数读取、更新和失效代理的移除
+    UPDATE_SCORE_SCRIPT = """
+    local score = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or 10)
+    if ARGV[2] == '1' then
+        score = math.min(score + 1, 100)
+    else
+        score = math.max(score - 2, 0)
+    end
+    if score == 0 then
+        redis.call('HDEL', KEYS[1], ARGV[1])
+        redis.call('SREM', KEYS[2], ARGV[1])
+    else
+        redis.call('HSET', KEYS[1], ARGV[1], score)
+    end
+    return tostring(score)
+    """
+    
+    def __init__(self, redis_url: str = "redis://localhost:6379/0",
+                 connection_pool: Optional[redis.ConnectionPool] = None):
+        self.redis_client = _create_redis_client(redis_url, connection_pool)
         self.proxy_key = "proxy_pool"
         self.score_key = "proxy_scores"
+        self._update_score_script = self.redis_client.register_script(self.UPDATE_SCORE_SCRIPT)
         self.check_interval = 300  # 5分钟检查一次代理可用性
         self._start_checker()
         
@@ -36,6 +76,15 @@ class ProxyPool:
         self.redis_client.sadd(self.proxy_key, proxy)
         self.redis_client.hset(self.score_key, proxy, score)
         
+    def add_proxies(self, proxies: List[str], score: float = 10.0):
+        """批量添加代理，一次往返写入"""
+        if not proxies:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.sadd(self.proxy_key, *proxies)
+        pipe.hset(self.score_key, mapping={proxy: score for proxy in proxies})
+        pipe.execute()
+        
     def remove_proxy(self, proxy: str):
         """移除代理"""
         self.redis_client.srem(self.proxy_key, proxy)
@@ -58,18 +107,13 @@ class ProxyPool:
         
         return proxy_scores[0][0] if proxy_scores else None
         
-    def update_score(self, proxy: str, success: bool):
-        """更新代理分数"""
-        current_score = float(self.redis_client.hget(self.score_key, proxy) or 10.0)
-        if success:
-            new_score = min(current_score + 1, 100)
-        else:
-            new_score = max(current_score - 2, 0)
-            
-        if new_score == 0:
-            self.remove_proxy(proxy)
-        else:
-            self.redis_client.hset(self.score_key, proxy, new_score)
+    def update_score(self, proxy: str, success: bool) -> float:
+        """更新代理分数，分数降为0时移除代理"""
+        new_score = self._update_score_script(
+            keys=[self.score_key, self.proxy_key],
+            args=[proxy, '1' if success else '0']
+        )
+        return float(new_score)
             
     def _check_proxies_periodically(self):
         """定期检查代理可用性"""
@@ -98,23 +142,19 @@ class ProxyPool:
         try:
             response = requests.get('https://www.kuaidaili.com/free/')
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'lxml')
-                for tr in soup.find_all('tr'):
-                    try:
-                        ip = tr.find('td', {'data-title': 'IP'}).text
-                        port = tr.find('td', {'data-title': 'PORT'}).text
-                        proxy = f"http://{ip}:{port}"
-                        self.add_proxy(proxy)
-                    except:
-                        continue
+                self.add_proxies([
+                    f"http://{ip}:{port}"
+                    for ip, port in PROXY_ROW_PATTERN.findall(response.text)
+                ])
         except Exception as e:
             logger.error(f"获取新代理失败: {str(e)}")
 
 class CookiePool:
     """Cookie池管理"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
-        self.redis_client = redis.from_url(redis_url)
+    def __init__(self, redis_url: str = "redis://localhost:6379/0",
+                 connection_pool: Optional[redis.ConnectionPool] = None):
+        self.redis_client = _create_redis_client(redis_url, connection_pool)
         self.cookie_key = "cookie_pool"
         self.cookie_counter_key = "cookie_counter"
         self.max_uses = 1000  # 每个Cookie最大使用次数
@@ -164,8 +204,24 @@ class CookiePool:
 class RateLimiter:
     """请求频率限制器"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
-        self.redis_client = redis.from_url(redis_url)
+    # 原子性检查并递增计数，超限时不递增
+    ACQUIRE_SCRIPT = """
+    local count = tonumber(redis.call('GET', KEYS[1]) or 0)
+    if count >= tonumber(ARGV[1]) then
+        return 0
+    end
+    if redis.call('INCR', KEYS[1]) == 1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 1
+    """
+    
+    def __init__(self, redis_url: str = "redis://localhost:6379/0", replica_url: Optional[str] = None,
+                 connection_pool: Optional[redis.ConnectionPool] = None):
+        self.redis_client = _create_redis_client(redis_url, connection_pool)
+        # 只读副本用于已限流窗口的快速拒绝，未配置时直接读主节点
+        self.replica_client = redis.from_url(replica_url) if replica_url else self.redis_client
+        self._acquire_script = self.redis_client.register_script(self.ACQUIRE_SCRIPT)
         self.window_size = 60  # 时间窗口大小（秒）
         self.max_requests = {
             'default': 100,     # 默认限制
@@ -179,20 +235,15 @@ class RateLimiter:
         current_time = int(time.time())
         window_key = f"rate_limit:{domain}:{current_time // self.window_size}"
         
-        # 获取当前时间窗口的请求数
-        count = int(self.redis_client.get(window_key) or 0)
         max_requests = self.max_requests.get(domain, self.max_requests['default'])
         
+        # 快速路径：从副本读取当前时间窗口的请求数，已超限则直接拒绝
+        count = int(self.replica_client.get(window_key) or 0)
         if count >= max_requests:
             return False
             
-        # 原子性递增并设置过期时间
-        pipe = self.redis_client.pipeline()
-        pipe.incr(window_key)
-        pipe.expire(window_key, self.window_size)
-        pipe.execute()
-        
-        return True
+        # 在主节点上原子性检查、递增并设置过期时间
+        return bool(self._acquire_script(keys=[window_key], args=[max_requests, self.window_size]))
         
     async def wait_if_needed(self, domain: str):
         """如果需要，等待直到可以发送请求"""
@@ -202,14 +253,20 @@ class RateLimiter:
 class AntiCrawler:
     """反爬虫工具集成类"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
-        self.proxy_pool = ProxyPool(redis_url)
-        self.cookie_pool = CookiePool(redis_url)
-        self.rate_limiter = RateLimiter(redis_url)
-        self.user_agent = UserAgent()
+    UA_POOL_SIZE = 256  # 预生成的User-Agent数量
+    
+    def __init__(self, redis_url: str = "redis://localhost:6379/0", replica_url: Optional[str] = None):
+        # 代理池、Cookie池和限流器共享同一个连接池
+        self._redis_pool = redis.ConnectionPool.from_url(redis_url, max_connections=50)
+        self.proxy_pool = ProxyPool(connection_pool=self._redis_pool)
+        self.cookie_pool = CookiePool(connection_pool=self._redis_pool)
+        self.rate_limiter = RateLimiter(replica_url=replica_url, connection_pool=self._redis_pool)
+        # 初始化时预生成User-Agent池，避免每次请求都调用fake_useragent
+        user_agent = UserAgent()
+        self._ua_pool = [user_agent.random for _ in range(self.UA_POOL_SIZE)]
         
-    async def get_session(self, domain: str) -> aiohttp.ClientSession:
-        """获取配置好的会话"""
+    async def _prepare_request(self, domain: str) -> Tuple[Dict[str, str], Optional[str]]:
+        """等待频率限制并生成请求头，返回(请求头, 代理)"""
         # 等待频率限制
         await self.rate_limiter.wait_if_needed(domain)
         
@@ -221,7 +278,7 @@ class AntiCrawler:
         
         # 构建请求头
         headers = {
-            'User-Agent': self.user_agent.random,
+            'User-Agent': random.choice(self._ua_pool),
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'Accept-Encoding': 'gzip, deflate, br',
@@ -232,6 +289,12 @@ class AntiCrawler:
         if cookie:
             headers['Cookie'] = cookie
             
+        return headers, proxy
+        
+    async def get_session(self, domain: str) -> aiohttp.ClientSession:
+        """获取配置好的会话"""
+        headers, proxy = await self._prepare_request(domain)
+        
         # 创建会话
         session = aiohttp.ClientSession(headers=headers)
         if proxy:
@@ -239,39 +302,62 @@ class AntiCrawler:
             
         return session
         
-    async def make_request(self, url: str, method: str = 'GET', **kwargs) -> Optional[Union[Dict, str]]:
-        """发送请求"""
-        domain = url.split('/')[2]
-        session = await self.get_session(domain)
+    async def make_request(self, url: str, method: str = 'GET', session: Optional[aiohttp.ClientSession] = None,
+                           **kwargs) -> Optional[Union[Dict, str]]:
+        """发送请求
         
-        try:
+        Args:
+            session: 调用方持有的共享会话，复用其连接池；为空时为本次请求单独创建会话
+        """
+        domain = _extract_domain(url)
+        if session is None:
+            session = await self.get_session(domain)
+            proxy = getattr(session, '_proxy', None)
             async with session:
-                async with session.request(method, url, **kwargs) as response:
-                    if response.status == 200:
-                        # 更新代理分数
-                        if hasattr(session, '_proxy'):
-                            self.proxy_pool.update_score(session._proxy, True)
-                            
-                        # 根据响应类型返回数据
-                        content_type = response.headers.get('Content-Type', '')
-                        if 'application/json' in content_type:
-                            return await response.json()
-                        else:
-                            return await response.text()
-                    else:
-                        # 更新代理分数
-                        if hasattr(session, '_proxy'):
-                            self.proxy_pool.update_score(session._proxy, False)
-                        return None
+                return await self._send(session, proxy, method, url, **kwargs)
+                
+        headers, proxy = await self._prepare_request(domain)
+        # 调用方传入的请求头优先于生成的伪装请求头
+        headers = {**headers, **(kwargs.pop('headers', None) or {})}
+        return await self._send(session, proxy, method, url, headers=headers, **kwargs)
+        
+    async def _send(self, session: aiohttp.ClientSession, pool_proxy: Optional[str], method: str, url: str,
+                    **kwargs) -> Optional[Union[Dict, str]]:
+        """通过指定会话发送请求并按结果更新代理分数
+        
+        调用方自行传入proxy时使用其代理，且不计入代理池的分数
+        """
+        if 'proxy' in kwargs:
+            pool_proxy = None
+        else:
+            kwargs['proxy'] = pool_proxy
+            
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                if response.status == 200:
+                    # 更新代理分数
+                    if pool_proxy:
+                        self.proxy_pool.update_score(pool_proxy, True)
                         
+                    # 根据响应类型返回数据
+                    content_type = response.headers.get('Content-Type', '')
+                    if 'application/json' in content_type:
+                        return await response.json()
+                    else:
+                        return await response.text()
+                else:
+                    # 更新代理分数
+                    if pool_proxy:
+                        self.proxy_pool.update_score(pool_proxy, False)
+                    return None
+                    
         except Exception as e:
             logger.error(f"请求失败: {str(e)}")
             # 更新代理分数
-            if hasattr(session, '_proxy'):
-                self.proxy_pool.update_score(session._proxy, False)
+            if pool_proxy:
+                self.proxy_pool.update_score(pool_proxy, False)
             return None
             
     def close(self):
         """关闭资源"""
-        # 可以添加清理代码
-        pass 
\ No newline at end of file
+        self._redis_pool.disconnect() 
\ No newline at end of file
@@ -2,8 +2,10 @@
 市场数据服务模块
 提供基础的市场数据获取功能
 """
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import logging
+import orjson
+import pandas as pd
 import yfinance as yf
 from openbb import obb
 from binance.client import Client
@@ -11,6 +13,10 @@ from binance.exceptions import BinanceAPIException
 
 logger = logging.getLogger(__name__)
 
+def _to_records(frame: pd.DataFrame) -> List[Dict]:
+    """将DataFrame转换为记录列表，由pandas的C序列化器和orjson完成，避免逐行构建字典"""
+    return orjson.loads(frame.to_json(orient='records', date_format='iso'))
+
 class MarketDataError(Exception):
     """市场数据错误基类"""
     pass
@@ -81,7 +87,7 @@ class MarketDataService:
                 return None
                 
             return {
-                'market_data': hist.to_dict('records'),
+                'market_data': _to_records(hist),
                 'current_price': float(hist['Close'].iloc[-1]),
                 'volume': int(hist['Volume'].iloc[-1]),
                 'timestamp': hist.index[-1].isoformat(),
@@ -103,7 +109,7 @@ class MarketDataService:
                 return None
                 
             return {
-                'market_data': data.to_dict('records') if not data.empty else [],
+                'market_data': _to_records(data) if not data.empty else [],
                 'current_price': float(data['Close'].iloc[-1]) if not data.empty else 0.0,
                 'volume': int(data['Volume'].iloc[-1]) if not data.empty else 0,
                 'timestamp': data.index[-1].isoformat() if not data.empty else None,
@@ -1,45 +1,83 @@
 import json
-from typing import Dict
+import hashlib
+import logging
+from typing import Dict, Optional
+import redis
 from openai import OpenAI
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 class RequirementAnalysisService:
     """需求分析服务"""
     
-    def __init__(self):
+    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
         """初始化服务"""
         self.openai_client = OpenAI(
             api_key=settings.OPENAI_API_KEY,
             base_url="https://api.openai.com/v1"
         )
-        
+        self.model = "gpt-3.5-turbo"  # 使用更稳定的模型
+        self.redis_client = redis.from_url(redis_url)
+        self.cache_key_prefix = "requirement_analysis"
+        self.cache_ttl = 7 * 24 * 3600  # 相同需求的分析结果缓存7天
+    
     def analyze_requirement(self, text: str) -> Dict:
         """分析需求文本"""
+        cache_key = self._cache_key(text)
+        cached = self._get_cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",  # 使用更稳定的模型
+                model=self.model,
                 messages=[
                     {"role": "system", "content": "你是一个专业的数据需求分析专家，请帮助分析用户的数据需求。"},
                     {"role": "user", "content": f"请分析以下数据需求，并返回JSON格式的结构化信息：{text}"}
-                ]
+                ],
+                response_format={"type": "json_object"}
             )
             
             # 解析响应
-            result = json.loads(response.choices[0].message.content)
-            return self._enrich_requirement(result)
-            
+            result = self._enrich_requirement(json.loads(response.choices[0].message.content))
+        
         except Exception as e:
             raise ValueError(f"需求分析失败: {str(e)}")
+        
+        self._set_cached_result(cache_key, result)
+        return result
     
     def validate_requirement(self, requirement: Dict) -> bool:
         """验证需求的完整性"""
         required_fields = {'data_type', 'timeframe', 'fields'}
         return all(field in requirement for field in required_fields)
-        
+    
     def _enrich_requirement(self, requirement: Dict) -> Dict:
         """增强需求信息"""
         if 'format' not in requirement:
             requirement['format'] = 'json'
         if 'frequency' not in requirement:
             requirement['frequency'] = 'once'
-        return requirement 
\ No newline at end of file
+        return requirement
+    
+    def _cache_key(self, text: str) -> str:
+        """按模型和需求文本的内容哈希生成缓存键"""
+        digest = hashlib.sha256(f"{self.model}:{text}".encode('utf-8')).hexdigest()
+        return f"{self.cache_key_prefix}:{digest}"
+    
+    def _get_cached_result(self, cache_key: str) -> Optional[Dict]:
+        """读取缓存的分析结果，Redis不可用时视为未命中"""
+        try:
+            cached = self.redis_client.get(cache_key)
+        except redis.RedisError as e:
+            logger.warning(f"读取需求分析缓存失败: {str(e)}")
+            return None
+        return json.loads(cached) if cached else None
+    
+    def _set_cached_result(self, cache_key: str, result: Dict):
+        """写入分析结果缓存"""
+        try:
+            self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(result))
+        except redis.RedisError as e:
+            logger.warning(f"写入需求分析缓存失败: {str(e)}")
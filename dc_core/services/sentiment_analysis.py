@@ -1,24 +1,160 @@
-from typing import Dict, List, Optional
-import pandas as pd
+from typing import Any, Callable, Dict, List, Optional
+import math
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 import numpy as np
 from datetime import datetime, timedelta
 from binance.client import Client
-from binance.exceptions import BinanceAPIException
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+import orjson
+from requests.adapters import HTTPAdapter
+from django.core.cache import caches
 import logging
+from dc_core.utils.jit import njit
 
 logger = logging.getLogger(__name__)
 
+# 情绪得分分段阈值及对应标签
+_SENTIMENT_THRESHOLDS = (0.3, 0.4, 0.6, 0.7)
+_SENTIMENT_LABELS = ("非常看空", "看空", "中性", "看多", "非常看多")
+
+# Binance SDK为阻塞IO，各项分析的请求在线程池中并发执行
+_BINANCE_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='binance')
+
+# 进程内共享的Binance客户端，连接池需不小于线程池并发数
+BINANCE_POOL_SIZE = 32
+_binance_client_lock = threading.Lock()
+
+class _OrjsonClient(Client):
+    """使用orjson解析响应体的Binance客户端，成交记录等列表接口的解析耗时明显低于标准库json"""
+    
+    @staticmethod
+    def _handle_response(response):
+        if not (200 <= response.status_code < 300):
+            raise BinanceAPIException(response, response.status_code, response.text)
+            
+        if not response.content:
+            return {}
+            
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            raise BinanceRequestException(f"Invalid Response: {response.text}")
+
+_binance_client: Optional[Client] = None
+
+def _get_binance_client() -> Client:
+    """获取共享的Binance客户端，首次调用时创建并调大HTTP连接池"""
+    global _binance_client
+    with _binance_client_lock:
+        if _binance_client is None:
+            client = _OrjsonClient()
+            adapter = HTTPAdapter(pool_connections=BINANCE_POOL_SIZE, pool_maxsize=BINANCE_POOL_SIZE)
+            client.session.mount('https://', adapter)
+            _binance_client = client
+        return _binance_client
+
+@njit(cache=True)
+def _technical_indicator_kernel(close: np.ndarray) -> tuple:
+    """单次遍历收盘价序列，计算最后一根K线的技术指标
+    
+    Returns:
+        (rsi, macd, signal, upper_band, middle_band, lower_band)，数据不足时对应值为NaN
+    """
+    n = close.shape[0]
+    alpha12 = 2.0 / 13.0
+    alpha26 = 2.0 / 27.0
+    alpha9 = 2.0 / 10.0
+    
+    ema12 = close[0]
+    ema26 = close[0]
+    signal = 0.0
+    gain_sum = 0.0
+    loss_sum = 0.0
+    for i in range(1, n):
+        price = close[i]
+        
+        # RSI：最近14个周期的涨跌幅（不足15根K线时首个周期计为0）
+        if i >= n - 14:
+            delta = price - close[i - 1]
+            if delta > 0:
+                gain_sum += delta
+            else:
+                loss_sum -= delta
+                
+        # MACD：EMA递推（与adjust=False的ewm一致）
+        ema12 = alpha12 * price + (1.0 - alpha12) * ema12
+        ema26 = alpha26 * price + (1.0 - alpha26) * ema26
+        signal = alpha9 * (ema12 - ema26) + (1.0 - alpha9) * signal
+        
+    rsi = np.nan
+    if n >= 14:
+        if loss_sum > 0:
+            rsi = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum)
+        elif gain_sum > 0:
+            rsi = 100.0
+            
+    # 布林带：最近20个周期的均值和样本标准差
+    middle = np.nan
+    upper = np.nan
+    lower = np.nan
+    if n >= 20:
+        total = 0.0
+        for i in range(n - 20, n):
+            total += close[i]
+        middle = total / 20.0
+        sq_sum = 0.0
+        for i in range(n - 20, n):
+            sq_sum += (close[i] - middle) ** 2
+        std = np.sqrt(sq_sum / 19.0)
+        upper = middle + 2.0 * std
+        lower = middle - 2.0 * std
+        
+    return rsi, ema12 - ema26, signal, upper, middle, lower
+
+def _trades_to_soa(trades: List[Dict]) -> np.ndarray:
+    """将成交记录列表转换为连续的成交额数组，后续统计只依赖该列"""
+    return np.fromiter(map(float, map(itemgetter('quoteQty'), trades)), dtype=np.float64, count=len(trades))
+
 class MarketSentimentService:
     """市场情绪分析服务"""
     
+    # Binance接口结果缓存有效期（秒）
+    CACHE_TTL = {
+        'klines': 60,
+        'order_book': 5,
+        'ticker': 5,
+        'recent_trades': 5
+    }
+    
     def __init__(self):
         """初始化市场情绪服务"""
         try:
-            self.binance = Client()
+            self.binance = _get_binance_client()
         except Exception as e:
             logger.error(f"Binance客户端初始化失败: {e}")
             self.binance = None
             
+    def _cached(self, key: tuple, fetch: Callable[[], Any]) -> Any:
+        """在有效期内复用相同接口请求的结果
+        
+        结果保存在Django的binance缓存中，默认写入磁盘，重启后及同一主机上的多个worker均可复用
+        
+        Args:
+            key: 缓存键，首个元素为接口名称
+            fetch: 缓存未命中时调用的请求函数
+        """
+        cache_key = 'binance:' + ':'.join(str(part) for part in key)
+        binance_cache = caches['binance']
+        value = binance_cache.get(cache_key)
+        if value is None:
+            value = fetch()
+            binance_cache.set(cache_key, value, self.CACHE_TTL[key[0]])
+        return value
+        
     def get_crypto_sentiment(self, symbol: str = 'BTCUSDT') -> Dict:
         """获取加密货币市场情绪数据
         
@@ -29,17 +165,19 @@ class MarketSentimentService:
             Dict: 包含市场情绪指标的字典
         """
         try:
-            # 获取技术指标
-            technical_indicators = self._get_technical_indicators(symbol)
-            
-            # 获取市场深度数据
-            market_depth = self._get_market_depth_analysis(symbol)
-            
-            # 获取交易量分析
-            volume_analysis = self._get_volume_analysis(symbol)
-            
-            # 获取大额交易信息
-            whale_analysis = self._get_whale_analysis(symbol)
+            # 并发获取技术指标、市场深度、交易量分析和大额交易信息
+            futures = [
+                _BINANCE_EXECUTOR.submit(analysis, symbol)
+                for analysis in (
+                    self._get_technical_indicators,
+                    self._get_market_depth_analysis,
+                    self._get_volume_analysis,
+                    self._get_whale_analysis
+                )
+            ]
+            technical_indicators, market_depth, volume_analysis, whale_analysis = [
+                future.result() for future in futures
+            ]
             
             # 汇总市场情绪
             sentiment = self._calculate_overall_sentiment(
@@ -72,58 +210,42 @@ class MarketSentimentService:
         """获取技术指标"""
         try:
             # 获取K线数据
-            klines = self.binance.get_klines(
-                symbol=symbol,
-                interval=Client.KLINE_INTERVAL_1HOUR,
-                limit=24  # 24小时数据
+            klines = self._cached(
+                # 缓存键带上当前小时，整点后新K线生成时不再复用上一小时的数据
+                ('klines', symbol, Client.KLINE_INTERVAL_1HOUR, 24, int(time.time() // 3600)),
+                lambda: self.binance.get_klines(
+                    symbol=symbol,
+                    interval=Client.KLINE_INTERVAL_1HOUR,
+                    limit=24  # 24小时数据
+                )
             )
             
-            df = pd.DataFrame(klines, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 
-                'volume', 'close_time', 'quote_volume', 'trades',
-                'taker_base', 'taker_quote', 'ignore'
-            ])
-            
-            df['close'] = df['close'].astype(float)
-            df['volume'] = df['volume'].astype(float)
-            
-            # 计算RSI
-            delta = df['close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            
-            # 计算MACD
-            exp1 = df['close'].ewm(span=12, adjust=False).mean()
-            exp2 = df['close'].ewm(span=26, adjust=False).mean()
-            macd = exp1 - exp2
-            signal = macd.ewm(span=9, adjust=False).mean()
-            
-            # 计算布林带
-            sma = df['close'].rolling(window=20).mean()
-            std = df['close'].rolling(window=20).std()
-            upper_band = sma + (std * 2)
-            lower_band = sma - (std * 2)
+            # 直接解析收盘价列（K线第5个字段），无需构建完整的DataFrame
+            close = np.fromiter((float(kline[4]) for kline in klines), dtype=np.float64, count=len(klines))
+            if close.size == 0:
+                raise ValueError(f"未获取到{symbol}的K线数据")
+                
+            # 计算RSI、MACD和布林带
+            rsi, macd, signal, upper_band, sma, lower_band = _technical_indicator_kernel(close)
             
-            current_price = float(df['close'].iloc[-1])
+            current_price = float(close[-1])
             
             return {
-                'rsi': float(rsi.iloc[-1]),
+                'rsi': float(rsi),
                 'macd': {
-                    'macd': float(macd.iloc[-1]),
-                    'signal': float(signal.iloc[-1]),
-                    'histogram': float(macd.iloc[-1] - signal.iloc[-1])
+                    'macd': float(macd),
+                    'signal': float(signal),
+                    'histogram': float(macd - signal)
                 },
                 'bollinger_bands': {
-                    'upper': float(upper_band.iloc[-1]),
-                    'middle': float(sma.iloc[-1]),
-                    'lower': float(lower_band.iloc[-1]),
+                    'upper': float(upper_band),
+                    'middle': float(sma),
+                    'lower': float(lower_band),
                     'current_price': current_price,
                     'position': self._get_bb_position(
                         current_price,
-                        float(upper_band.iloc[-1]),
-                        float(lower_band.iloc[-1])
+                        float(upper_band),
+                        float(lower_band)
                     )
                 }
             }
@@ -135,20 +257,37 @@ class MarketSentimentService:
     def _get_market_depth_analysis(self, symbol: str) -> Dict:
         """分析市场深度"""
         try:
-            depth = self.binance.get_order_book(symbol=symbol, limit=20)
+            depth = self._cached(
+                ('order_book', symbol, 20),
+                lambda: self.binance.get_order_book(symbol=symbol, limit=20)
+            )
             
-            bids = pd.DataFrame(depth['bids'], columns=['price', 'quantity'], dtype=float)
-            asks = pd.DataFrame(depth['asks'], columns=['price', 'quantity'], dtype=float)
+            # 每档为[价格, 数量]
+            bids = np.asarray(depth['bids'], dtype=np.float64).reshape(-1, 2)
+            asks = np.asarray(depth['asks'], dtype=np.float64).reshape(-1, 2)
             
-            bid_sum = (bids['price'] * bids['quantity']).sum()
-            ask_sum = (asks['price'] * asks['quantity']).sum()
+            bid_sum = float(np.dot(bids[:, 0], bids[:, 1]))
+            ask_sum = float(np.dot(asks[:, 0], asks[:, 1]))
             
+            # 各档挂单量占买卖盘总挂单量的比例
+            total_quantity = bids[:, 1].sum() + asks[:, 1].sum()
+            if total_quantity > 0:
+                bid_shares = bids[:, 1] / total_quantity
+                ask_shares = asks[:, 1] / total_quantity
+            else:
+                bid_shares = np.zeros(len(bids))
+                ask_shares = np.zeros(len(asks))
+                
             return {
-                'buy_pressure': float(bid_sum),
-                'sell_pressure': float(ask_sum),
+                'buy_pressure': bid_sum,
+                'sell_pressure': ask_sum,
                 'pressure_ratio': float(bid_sum / ask_sum if ask_sum > 0 else 1),
-                'spread': float(asks['price'].iloc[0] - bids['price'].iloc[0]),
-                'depth_score': self._calculate_depth_score(bids, asks)
+                'spread': float(asks[0, 0] - bids[0, 0]),
+                'depth_score': self._calculate_depth_score(bid_sum, ask_sum),
+                'volume_share': {
+                    'bids': bid_shares.tolist(),
+                    'asks': ask_shares.tolist()
+                }
             }
             
         except Exception as e:
@@ -159,7 +298,10 @@ class MarketSentimentService:
         """分析交易量"""
         try:
             # 获取24小时统计数据
-            ticker = self.binance.get_ticker(symbol=symbol)
+            ticker = self._cached(
+                ('ticker', symbol),
+                lambda: self.binance.get_ticker(symbol=symbol)
+            )
             
             return {
                 'volume_24h': float(ticker['volume']),
@@ -177,17 +319,32 @@ class MarketSentimentService:
         """分析大户活动"""
         try:
             # 获取最近的大额交易
-            trades = self.binance.get_recent_trades(symbol=symbol, limit=100)
+            trades = self._cached(
+                ('recent_trades', symbol, 100),
+                lambda: self.binance.get_recent_trades(symbol=symbol, limit=100)
+            )
+            if not trades:
+                return {
+                    'whale_trades_count': 0,
+                    'total_whale_volume': 0.0,
+                    'avg_whale_trade_size': 0,
+                    'whale_activity_score': 0.5
+                }
+                
+            # 一次性解析成交额，后续统计均基于该数组
+            volumes = _trades_to_soa(trades)
             
             # 筛选大额交易
-            threshold = self._calculate_whale_threshold(trades)
-            whale_trades = [t for t in trades if float(t['quoteQty']) > threshold]
+            threshold = self._calculate_whale_threshold(volumes)
+            whale_mask = volumes > threshold
+            whale_count = int(whale_mask.sum())
+            whale_volume = float(volumes[whale_mask].sum())
             
             return {
-                'whale_trades_count': len(whale_trades),
-                'total_whale_volume': sum(float(t['quoteQty']) for t in whale_trades),
-                'avg_whale_trade_size': sum(float(t['quoteQty']) for t in whale_trades) / len(whale_trades) if whale_trades else 0,
-                'whale_activity_score': self._calculate_whale_score(whale_trades, trades)
+                'whale_trades_count': whale_count,
+                'total_whale_volume': whale_volume,
+                'avg_whale_trade_size': whale_volume / whale_count if whale_count else 0,
+                'whale_activity_score': self._calculate_whale_score(whale_volume, float(volumes.sum()))
             }
             
         except Exception as e:
@@ -245,19 +402,14 @@ class MarketSentimentService:
                 details.append("大户活动频繁")
                 
         # 计算综合得分
-        final_score = np.mean(scores) if scores else 0.5
+        # 最多4个标量得分，直接求均值，避免np.mean对列表的数组转换开销
+        final_score = sum(scores) / len(scores) if scores else 0.5
         
-        # 确定情绪标签
-        if final_score >= 0.7:
-            sentiment = "非常看多"
-        elif final_score >= 0.6:
-            sentiment = "看多"
-        elif final_score >= 0.4:
-            sentiment = "中性"
-        elif final_score >= 0.3:
-            sentiment = "看空"
+        # 确定情绪标签（得分无效时视为最低档）
+        if math.isnan(final_score):
+            sentiment = _SENTIMENT_LABELS[0]
         else:
-            sentiment = "非常看空"
+            sentiment = _SENTIMENT_LABELS[bisect_right(_SENTIMENT_THRESHOLDS, final_score)]
             
         return {
             'score': float(final_score),
@@ -274,11 +426,8 @@ class MarketSentimentService:
         else:
             return "区间内"
             
-    def _calculate_depth_score(self, bids: pd.DataFrame, asks: pd.DataFrame) -> float:
-        """计算市场深度得分"""
-        bid_sum = (bids['price'] * bids['quantity']).sum()
-        ask_sum = (asks['price'] * asks['quantity']).sum()
-        
+    def _calculate_depth_score(self, bid_sum: float, ask_sum: float) -> float:
+        """根据买卖盘挂单金额计算市场深度得分"""
         ratio = bid_sum / ask_sum if ask_sum > 0 else 1
         return self._normalize_pressure_ratio(ratio)
         
@@ -295,24 +444,22 @@ class MarketSentimentService:
         except Exception:
             return 0.5
             
-    def _calculate_whale_score(self, whale_trades: List, all_trades: List) -> float:
-        """计算大户活动得分"""
-        if not all_trades:
-            return 0.5
-            
-        whale_volume = sum(float(t['quoteQty']) for t in whale_trades)
-        total_volume = sum(float(t['quoteQty']) for t in all_trades)
-        
+    def _calculate_whale_score(self, whale_volume: float, total_volume: float) -> float:
+        """根据大额成交占比计算大户活动得分"""
         ratio = whale_volume / total_volume if total_volume > 0 else 0
         return self._normalize_ratio(ratio, 0.1, 0.5)
         
-    def _calculate_whale_threshold(self, trades: List) -> float:
+    def _calculate_whale_threshold(self, volumes: np.ndarray) -> float:
         """计算大户交易阈值"""
-        if not trades:
+        if volumes.size == 0:
             return 0
             
-        volumes = [float(t['quoteQty']) for t in trades]
-        return np.percentile(volumes, 90)  # 取90分位数作为阈值
+        # 取90分位数作为阈值：只对相邻两个次序统计量做部分排序，再按np.percentile的方式线性插值
+        position = 0.9 * (volumes.size - 1)
+        lower = int(position)
+        upper = min(lower + 1, volumes.size - 1)
+        partitioned = np.partition(volumes, (lower, upper))
+        return float(partitioned[lower] + (partitioned[upper] - partitioned[lower]) * (position - lower))
         
     def _normalize_rsi(self, rsi: float) -> float:
         """标准化RSI值为0-1分数"""
@@ -329,9 +476,4 @@ class MarketSentimentService:
         
     def _normalize_ratio(self, ratio: float, min_ratio: float, max_ratio: float) -> float:
         """将比率标准化到0-1范围"""
-        if ratio <= min_ratio:
-            return 0
-        elif ratio >= max_ratio:
-            return 1
-        else:
-            return (ratio - min_ratio) / (max_ratio - min_ratio) 
\ No newline at end of file
+        return min(1.0, max(0.0, (ratio - min_ratio) / (max_ratio - min_ratio))) 
\ No newline at end of file
@@ -1,6 +1,8 @@
 import os
+import re
 import logging
 import asyncio
+import time
 from typing import Dict, List, Optional
 import tweepy
 from dotenv import load_dotenv
@@ -11,14 +13,43 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# 情绪关键词
+BULLISH_KEYWORDS = frozenset([
+    'buy', 'long', 'bullish', 'moon', 'pump',
+    'hodl', 'hold', 'up', 'rise', 'rising',
+    'gain', 'profit', 'bull', 'breakout'
+])
+BEARISH_KEYWORDS = frozenset([
+    'sell', 'short', 'bearish', 'dump', 'crash',
+    'down', 'fall', 'falling', 'loss', 'bear',
+    'breakdown', 'correction', 'dip'
+])
+
+# 关键词按子串匹配（'bullish'同时命中'bull'，'support'命中'up'），与web_scrapers的关键词扫描一致。
+# 所有关键词合并为一个零宽前瞻正则，较长的关键词排在前面，单次扫描得到每个位置上最长的关键词；
+# 从同一位置开始的较短关键词是其子串，通过KEYWORD_SUBSTRINGS补全
+SENTIMENT_KEYWORDS = BULLISH_KEYWORDS | BEARISH_KEYWORDS
+KEYWORD_PATTERN = re.compile(
+    '(?=(' + '|'.join(map(re.escape, sorted(SENTIMENT_KEYWORDS, key=lambda word: (-len(word), word)))) + '))'
+)
+KEYWORD_SUBSTRINGS = {
+    keyword: frozenset(other for other in SENTIMENT_KEYWORDS if other in keyword)
+    for keyword in SENTIMENT_KEYWORDS
+}
+
+def _find_keywords(text: str) -> frozenset:
+    """返回以子串形式出现在文本中的情绪关键词集合"""
+    return frozenset().union(*(KEYWORD_SUBSTRINGS[keyword] for keyword in set(KEYWORD_PATTERN.findall(text))))
+
 class SocialSentimentService:
     """社交媒体情绪分析服务"""
     
     def __init__(self):
         """初始化Twitter客户端"""
         self.twitter_client = self._init_twitter_client()
-        self._last_twitter_request = datetime.min
+        self._last_twitter_request = float('-inf')  # 上次请求的单调时钟时间
         self._twitter_rate_limit = 2.0  # 每2秒最多1个请求
+        self._twitter_lock = asyncio.Lock()  # 串行化并发请求，保证请求间隔
         
     def _init_twitter_client(self) -> Optional[tweepy.Client]:
         """初始化Twitter客户端"""
@@ -82,21 +113,24 @@ class SocialSentimentService:
             if not self.twitter_client:
                 return None
                 
-            # 实现简单的速率限制
-            now = datetime.now()
-            time_since_last_request = (now - self._last_twitter_request).total_seconds()
-            if time_since_last_request < self._twitter_rate_limit:
-                await asyncio.sleep(self._twitter_rate_limit - time_since_last_request)
-            
-            # 搜索相关推文
-            query = f"{symbol} (crypto OR bitcoin OR cryptocurrency) lang:en -is:retweet"
-            tweets = self.twitter_client.search_recent_tweets(
-                query=query,
-                max_results=20,  # 减少请求数量
-                tweet_fields=['created_at', 'public_metrics']
-            )
-            
-            self._last_twitter_request = datetime.now()
+            async with self._twitter_lock:
+                # 实现简单的速率限制（使用单调时钟，不受系统时间调整影响）
+                wait = self._twitter_rate_limit - (time.monotonic() - self._last_twitter_request)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    
+                # 搜索相关推文（tweepy为同步调用，放到线程中执行以免阻塞事件循环）
+                query = f"{symbol} (crypto OR bitcoin OR cryptocurrency) lang:en -is:retweet"
+                tweets = await asyncio.to_thread(
+                    self.twitter_client.search_recent_tweets,
+                    query=query,
+                    max_results=20,  # 减少请求数量
+                    tweet_fields=['created_at', 'public_metrics']
+                )
+                
+                self._last_twitter_request = time.monotonic()
+                
+            fetched_at = datetime.now()
             
             if not tweets.data:
                 return None
@@ -105,7 +139,7 @@ class SocialSentimentService:
             return {
                 'tweet_count': len(tweets.data),
                 'metrics': self._analyze_tweets(tweets.data),
-                'timestamp': datetime.now().isoformat()
+                'timestamp': fetched_at.isoformat()
             }
             
         except Exception as e:
@@ -120,23 +154,12 @@ class SocialSentimentService:
             'neutral': 0
         }
         
-        # 扩展关键词列表
-        bullish_keywords = [
-            'buy', 'long', 'bullish', 'moon', 'pump',
-            'hodl', 'hold', 'up', 'rise', 'rising',
-            'gain', 'profit', 'bull', 'breakout'
-        ]
-        bearish_keywords = [
-            'sell', 'short', 'bearish', 'dump', 'crash',
-            'down', 'fall', 'falling', 'loss', 'bear',
-            'breakdown', 'correction', 'dip'
-        ]
-        
         for tweet in tweets:
-            text = tweet.text.lower()
+            # 单次扫描得到出现的关键词后与各极性的关键词集合求交集，统计命中的关键词数量
+            keywords = _find_keywords(tweet.text.lower())
             
-            bullish_count = sum(1 for word in bullish_keywords if word in text)
-            bearish_count = sum(1 for word in bearish_keywords if word in text)
+            bullish_count = len(keywords & BULLISH_KEYWORDS)
+            bearish_count = len(keywords & BEARISH_KEYWORDS)
             
             if bullish_count > bearish_count:
                 sentiment_counts['bullish'] += 1
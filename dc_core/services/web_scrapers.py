@@ -1,31 +1,177 @@
-from typing import Dict, List, Any
-import requests
-from bs4 import BeautifulSoup
+from typing import Dict, List, Any, Optional, Union
+from lxml import etree, html as lxml_html
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import aiohttp
 import asyncio
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import random
 import re
 import json
 import logging
+from collections import Counter
 from fake_useragent import UserAgent
 from .anti_crawler import AntiCrawler
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
 logger = logging.getLogger(__name__)
 
-class MarketSentimentScraper:
-    """市场情绪数据爬虫"""
+# 模块级User-Agent池，避免每次创建爬虫时重新加载fake-useragent数据
+UA_POOL_SIZE = 256
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+def _build_ua_pool() -> tuple:
+    """预生成User-Agent池，fake-useragent不可用时退回默认值"""
+    try:
+        user_agent = UserAgent()
+        return tuple(user_agent.random for _ in range(UA_POOL_SIZE))
+    except Exception as e:
+        logger.warning(f"User-Agent池初始化失败: {str(e)}")
+        return (DEFAULT_USER_AGENT,)
+
+_UA_POOL = _build_ua_pool()
+
+# 各数据源的URL模板
+TWITTER_SEARCH_URL = "https://api.twitter.com/2/tweets/search/recent?query=${}"
+REDDIT_SEARCH_URL = "https://www.reddit.com/r/{}/search.json"
+STOCKTWITS_STREAM_URL = "https://api.stocktwits.com/api/2/streams/symbol/{}.json"
+XUEQIU_STOCK_URL = "https://xueqiu.com/S/{}"
+EASTMONEY_GUBA_URL = "http://guba.eastmoney.com/list,{}.html"
+SINA_NEWS_URL = "https://vip.stock.finance.sina.com.cn/corp/go.php/vCB_AllNewsStock/symbol/{}.phtml"
+EASTMONEY_LEVEL2_URL = "http://push2.eastmoney.com/api/qt/stock/get?secid={}&fields=f47,f48,f49,f50,f51,f52,f53,f54,f55,f56,f57,f58"
+EASTMONEY_BIG_DEALS_URL = "http://push2.eastmoney.com/api/qt/stock/get?secid={}&fields=f19,f20,f21,f22"
+EASTMONEY_TOP_TRADERS_URL = "http://data.eastmoney.com/stock/lhb,{}.html"
+
+# 共享的HTML解析器及预编译的XPath查询，避免为每个页面构建BeautifulSoup节点树
+_HTML_PARSER = lxml_html.HTMLParser(recover=True, remove_blank_text=True)
+
+def _class_xpath(tag: str, class_name: str) -> str:
+    """生成按class匹配元素的XPath片段（与CSS的.class语义一致）"""
+    return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+def _css_to_xpath(selector: str, axis: str) -> etree.XPath:
+    """将'tag'或'tag.class'形式的简单CSS选择器编译为XPath"""
+    tag, _, class_name = selector.partition('.')
+    return etree.XPath(axis + (_class_xpath(tag, class_name) if class_name else tag))
+
+TOP_TRADERS_BUY_ROWS = etree.XPath('//' + _class_xpath('*', 'tab1') + '//tr')
+TOP_TRADERS_SELL_ROWS = etree.XPath('//' + _class_xpath('*', 'tab2') + '//tr')
+
+def _parse_html(html: str):
+    """使用共享解析器将HTML文本解析为lxml节点树"""
+    return lxml_html.fromstring(html, parser=_HTML_PARSER)
+
+class _NewsSelector:
+    """新闻列表选择器，selectolax可用时由其lexbor解析器按CSS选择器提取，否则使用等价的lxml XPath"""
+    
+    def __init__(self, item: str, title: str, time: str):
+        self.item = item
+        self.title = title
+        self.time = time
+        self.item_xpath = _css_to_xpath(item, '//')
+        self.title_xpath = _css_to_xpath(title, './/')
+        self.time_xpath = _css_to_xpath(time, './/')
+        
+    def extract(self, html: str, limit: int = 10) -> List[Dict]:
+        """提取前limit条新闻的标题和时间，缺少标题或时间的条目跳过"""
+        news_data = []
+        if LexborHTMLParser is not None:
+            for element in LexborHTMLParser(html).css(self.item)[:limit]:
+                title = element.css_first(self.title)
+                time = element.css_first(self.time)
+                if title is None or time is None:
+                    continue
+                news_data.append({
+                    'title': title.text().strip(),
+                    'time': time.text().strip()
+                })
+        else:
+            for element in self.item_xpath(_parse_html(html))[:limit]:
+                titles = self.title_xpath(element)
+                times = self.time_xpath(element)
+                if not titles or not times:
+                    continue
+                news_data.append({
+                    'title': titles[0].text_content().strip(),
+                    'time': times[0].text_content().strip()
+                })
+        return news_data
+
+XUEQIU_NEWS = _NewsSelector('div.timeline__item', 'div.timeline__title', 'div.timeline__time')
+EASTMONEY_NEWS = _NewsSelector('div.article-list', 'a.title', 'span.time')
+SINA_NEWS = _NewsSelector('div.datelist', 'a', 'span')
+
+# 情绪关键词及其极性（按子串匹配）
+POSITIVE_KEYWORDS = ('buy', 'bullish', 'long', 'up', 'good', 'great')
+NEGATIVE_KEYWORDS = ('sell', 'bearish', 'short', 'down', 'bad', 'poor')
+KEYWORD_POLARITY = {**dict.fromkeys(POSITIVE_KEYWORDS, 1), **dict.fromkeys(NEGATIVE_KEYWORDS, -1)}
+REDDIT_POSITIVE_KEYWORDS = frozenset(('buy', 'bullish', 'long'))
+REDDIT_NEGATIVE_KEYWORDS = frozenset(('sell', 'bearish', 'short'))
+
+# 所有关键词合并为一个正则，零宽前瞻保证重叠出现的关键词也能匹配，单次扫描即可得到文本中出现的关键词
+KEYWORD_PATTERN = re.compile('(?=(' + '|'.join(map(re.escape, KEYWORD_POLARITY)) + '))')
+
+def _find_keywords(text: str) -> set:
+    """返回文本中出现的情绪关键词集合"""
+    return set(KEYWORD_PATTERN.findall(text))
+
+def _reddit_title_sentiment(title: str) -> str:
+    """基于标题关键词判断Reddit帖子的情绪分类，看多关键词优先"""
+    keywords = _find_keywords(title.lower())
+    if keywords & REDDIT_POSITIVE_KEYWORDS:
+        return 'positive'
+    if keywords & REDDIT_NEGATIVE_KEYWORDS:
+        return 'negative'
+    return 'neutral'
+
+# StockTwits情绪标签到统计分类的映射，其余标签归为neutral
+STOCKTWITS_SENTIMENT_BUCKETS = {'Bullish': 'bullish', 'Bearish': 'bearish'}
+
+def _stocktwits_sentiment(message: Dict) -> str:
+    """读取StockTwits消息的情绪标签，未标注（字段缺失或为null）时返回空字符串"""
+    try:
+        return message['entities']['sentiment']['basic']
+    except (KeyError, TypeError):
+        return ''
+
+class BaseScraper:
+    """爬虫基类
+    
+    作为异步上下文管理器使用时，上下文内的所有请求复用同一个HTTP会话及其连接池：
+        async with MarketSentimentScraper() as scraper:
+            await scraper.get_social_sentiment('AAPL')
+    """
+    
+    MAX_CONNECTIONS_PER_HOST = 64
+    DNS_CACHE_TTL = 300
     
     def __init__(self, redis_url: str = "redis://localhost:6379/0"):
         self.anti_crawler = AntiCrawler(redis_url)
-        self.headers = {'User-Agent': UserAgent().random}
-        self.session = requests.Session()
+        self.headers = {'User-Agent': random.choice(_UA_POOL)}
+        self._session: Optional[aiohttp.ClientSession] = None
         
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self.MAX_CONNECTIONS_PER_HOST, ttl_dns_cache=self.DNS_CACHE_TTL),
+            cookie_jar=aiohttp.DummyCookieJar()  # Cookie由CookiePool按域名提供，不在会话中累积
+        )
+        return self
+        
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+        
+    async def _fetch(self, url: str, **kwargs) -> Optional[Union[Dict, str]]:
+        """通过反爬虫工具发送请求，在上下文中时复用共享会话"""
+        return await self.anti_crawler.make_request(url, session=self._session, **kwargs)
+
+class MarketSentimentScraper(BaseScraper):
+    """市场情绪数据爬虫"""
+    
     async def get_social_sentiment(self, symbol: str) -> Dict:
         """获取社交媒体情绪数据
         
@@ -71,8 +217,8 @@ class MarketSentimentScraper:
     async def _get_twitter_sentiment(self, symbol: str) -> Dict:
         """获取 Twitter 情绪数据"""
         try:
-            url = f"https://api.twitter.com/2/tweets/search/recent?query=${symbol}"
-            data = await self.anti_crawler.make_request(url)
+            url = TWITTER_SEARCH_URL.format(symbol)
+            data = await self._fetch(url)
             if data:
                 return self._analyze_tweets(data)
             return {}
@@ -84,16 +230,24 @@ class MarketSentimentScraper:
         """获取 Reddit 情绪数据"""
         try:
             subreddits = ['wallstreetbets', 'stocks', 'investing']
-            all_posts = []
+            params = {
+                'q': symbol,
+                't': 'day',
+                'sort': 'top'
+            }
             
-            for subreddit in subreddits:
-                url = f"https://www.reddit.com/r/{subreddit}/search.json"
-                params = {
-                    'q': symbol,
-                    't': 'day',
-                    'sort': 'top'
-                }
-                data = await self.anti_crawler.make_request(url, params=params)
+            # 并发请求各子版块，单个版块失败不影响其他版块的结果
+            tasks = [
+                self._fetch(REDDIT_SEARCH_URL.format(subreddit), params=params)
+                for subreddit in subreddits
+            ]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            all_posts = []
+            for subreddit, data in zip(subreddits, results):
+                if isinstance(data, Exception):
+                    logger.warning(f"获取Reddit版块{subreddit}数据失败: {str(data)}")
+                    continue
                 if data:
                     posts = data.get('data', {}).get('children', [])
                     all_posts.extend(posts)
@@ -106,8 +260,8 @@ class MarketSentimentScraper:
     async def _get_stocktwits_sentiment(self, symbol: str) -> Dict:
         """获取 StockTwits 情绪数据"""
         try:
-            url = f"https://api.stocktwits.com/api/2/streams/symbol/{symbol}.json"
-            data = await self.anti_crawler.make_request(url)
+            url = STOCKTWITS_STREAM_URL.format(symbol)
+            data = await self._fetch(url)
             if data:
                 return self._analyze_stocktwits(data)
             return {}
@@ -118,32 +272,12 @@ class MarketSentimentScraper:
     async def _get_xueqiu_news(self, symbol: str) -> Dict:
         """获取雪球新闻数据"""
         try:
-            # 处理股票代码格式
-            if '.' in symbol:
-                code = symbol.split('.')[0]
-            else:
-                code = symbol
-                
-            url = f"https://xueqiu.com/S/{code}"
-            html = await self.anti_crawler.make_request(url)
+            # 处理股票代码格式，去掉交易所后缀
+            code = symbol.partition('.')[0]
+            url = XUEQIU_STOCK_URL.format(code)
+            html = await self._fetch(url)
             if html:
-                # 使用BeautifulSoup解析HTML
-                soup = BeautifulSoup(html, 'lxml')
-                
-                news_elements = soup.find_all('div', class_='timeline__item')
-                news_data = []
-                
-                for element in news_elements[:10]:
-                    try:
-                        title = element.find('div', class_='timeline__title').text.strip()
-                        time = element.find('div', class_='timeline__time').text.strip()
-                        news_data.append({
-                            'title': title,
-                            'time': time
-                        })
-                    except:
-                        continue
-                        
+                news_data = XUEQIU_NEWS.extract(html)
                 return {
                     'news_count': len(news_data),
                     'news': news_data
@@ -156,25 +290,10 @@ class MarketSentimentScraper:
     async def _get_eastmoney_news(self, symbol: str) -> Dict:
         """获取东方财富新闻数据"""
         try:
-            url = f"http://guba.eastmoney.com/list,{symbol}.html"
-            html = await self.anti_crawler.make_request(url)
+            url = EASTMONEY_GUBA_URL.format(symbol)
+            html = await self._fetch(url)
             if html:
-                soup = BeautifulSoup(html, 'lxml')
-                
-                news_list = soup.find_all('div', class_='article-list')
-                news_data = []
-                
-                for news in news_list[:10]:
-                    try:
-                        title = news.find('a', class_='title').text.strip()
-                        time = news.find('span', class_='time').text.strip()
-                        news_data.append({
-                            'title': title,
-                            'time': time
-                        })
-                    except:
-                        continue
-                        
+                news_data = EASTMONEY_NEWS.extract(html)
                 return {
                     'news_count': len(news_data),
                     'news': news_data
@@ -187,25 +306,10 @@ class MarketSentimentScraper:
     async def _get_sina_news(self, symbol: str) -> Dict:
         """获取新浪财经新闻数据"""
         try:
-            url = f"https://vip.stock.finance.sina.com.cn/corp/go.php/vCB_AllNewsStock/symbol/{symbol}.phtml"
-            html = await self.anti_crawler.make_request(url)
+            url = SINA_NEWS_URL.format(symbol)
+            html = await self._fetch(url)
             if html:
-                soup = BeautifulSoup(html, 'lxml')
-                
-                news_list = soup.find_all('div', class_='datelist')
-                news_data = []
-                
-                for news in news_list[:10]:
-                    try:
-                        title = news.find('a').text.strip()
-                        time = news.find('span').text.strip()
-                        news_data.append({
-                            'title': title,
-                            'time': time
-                        })
-                    except:
-                        continue
-                        
+                news_data = SINA_NEWS.extract(html)
                 return {
                     'news_count': len(news_data),
                     'news': news_data
@@ -218,91 +322,74 @@ class MarketSentimentScraper:
     def _analyze_tweets(self, data: Dict) -> Dict:
         """分析 Twitter 数据"""
         tweets = data.get('data', [])
+        if not tweets:
+            return {
+                'tweet_count': 0,
+                'average_sentiment': 0,
+                'positive_count': 0,
+                'negative_count': 0,
+                'neutral_count': 0
+            }
         
-        # 简单的情绪分析
-        positive_keywords = ['buy', 'bullish', 'long', 'up', 'good', 'great']
-        negative_keywords = ['sell', 'bearish', 'short', 'down', 'bad', 'poor']
+        # 简单的情绪分析：每个出现的关键词按极性计分一次
+        sentiment_scores = np.fromiter(
+            (sum(KEYWORD_POLARITY[word] for word in _find_keywords(tweet.get('text', '').lower())) for tweet in tweets),
+            dtype=np.int64,
+            count=len(tweets)
+        )
+        positive_count = int(np.count_nonzero(sentiment_scores > 0))
+        negative_count = int(np.count_nonzero(sentiment_scores < 0))
         
-        sentiment_scores = []
-        for tweet in tweets:
-            text = tweet.get('text', '').lower()
-            score = 0
-            for word in positive_keywords:
-                if word in text:
-                    score += 1
-            for word in negative_keywords:
-                if word in text:
-                    score -= 1
-            sentiment_scores.append(score)
-            
         return {
             'tweet_count': len(tweets),
-            'average_sentiment': sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0,
-            'positive_count': len([s for s in sentiment_scores if s > 0]),
-            'negative_count': len([s for s in sentiment_scores if s < 0]),
-            'neutral_count': len([s for s in sentiment_scores if s == 0])
+            'average_sentiment': float(sentiment_scores.mean()),
+            'positive_count': positive_count,
+            'negative_count': negative_count,
+            'neutral_count': len(tweets) - positive_count - negative_count
         }
         
     def _analyze_reddit_posts(self, posts: List) -> Dict:
         """分析 Reddit 帖子"""
-        sentiment_data = {
+        post_data = [post.get('data', {}) for post in posts]
+        
+        # 数值字段提取为连续数组后一次性求和
+        scores = np.fromiter((data.get('score', 0) for data in post_data), dtype=np.int64, count=len(post_data))
+        comments = np.fromiter((data.get('num_comments', 0) for data in post_data), dtype=np.int64, count=len(post_data))
+        
+        # 基于标题的简单情绪分析
+        counts = Counter(_reddit_title_sentiment(data.get('title', '')) for data in post_data)
+        
+        return {
             'post_count': len(posts),
-            'total_score': 0,
-            'total_comments': 0,
+            'total_score': int(scores.sum()),
+            'total_comments': int(comments.sum()),
             'sentiment_distribution': {
-                'positive': 0,
-                'negative': 0,
-                'neutral': 0
+                'positive': counts['positive'],
+                'negative': counts['negative'],
+                'neutral': counts['neutral']
             }
         }
         
-        for post in posts:
-            post_data = post.get('data', {})
-            sentiment_data['total_score'] += post_data.get('score', 0)
-            sentiment_data['total_comments'] += post_data.get('num_comments', 0)
-            
-            # 基于标题的简单情绪分析
-            title = post_data.get('title', '').lower()
-            if any(word in title for word in ['buy', 'bullish', 'long']):
-                sentiment_data['sentiment_distribution']['positive'] += 1
-            elif any(word in title for word in ['sell', 'bearish', 'short']):
-                sentiment_data['sentiment_distribution']['negative'] += 1
-            else:
-                sentiment_data['sentiment_distribution']['neutral'] += 1
-                
-        return sentiment_data
-        
     def _analyze_stocktwits(self, data: Dict) -> Dict:
         """分析 StockTwits 数据"""
         messages = data.get('messages', [])
+        counts = Counter(
+            STOCKTWITS_SENTIMENT_BUCKETS.get(_stocktwits_sentiment(message), 'neutral')
+            for message in messages
+        )
         
-        sentiment_data = {
+        return {
             'message_count': len(messages),
             'sentiment_distribution': {
-                'bullish': 0,
-                'bearish': 0,
-                'neutral': 0
+                'bullish': counts['bullish'],
+                'bearish': counts['bearish'],
+                'neutral': counts['neutral']
             }
         }
-        
-        for message in messages:
-            sentiment = message.get('entities', {}).get('sentiment', {}).get('basic', '')
-            if sentiment == 'Bullish':
-                sentiment_data['sentiment_distribution']['bullish'] += 1
-            elif sentiment == 'Bearish':
-                sentiment_data['sentiment_distribution']['bearish'] += 1
-            else:
-                sentiment_data['sentiment_distribution']['neutral'] += 1
-                
-        return sentiment_data
 
-class TradeDataScraper:
+class TradeDataScraper(BaseScraper):
     """交易数据爬虫"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
-        self.anti_crawler = AntiCrawler(redis_url)
-        self.headers = {'User-Agent': UserAgent().random}
-        
     async def get_trade_data(self, symbol: str) -> Dict:
         """获取交易数据
         
@@ -327,8 +414,8 @@ class TradeDataScraper:
     async def _get_level2_data(self, symbol: str) -> Dict:
         """获取 Level 2 数据"""
         try:
-            url = f"http://push2.eastmoney.com/api/qt/stock/get?secid={symbol}&fields=f47,f48,f49,f50,f51,f52,f53,f54,f55,f56,f57,f58"
-            data = await self.anti_crawler.make_request(url)
+            url = EASTMONEY_LEVEL2_URL.format(symbol)
+            data = await self._fetch(url)
             if data:
                 return self._parse_level2_data(data)
             return {}
@@ -339,8 +426,8 @@ class TradeDataScraper:
     async def _get_big_deals(self, symbol: str) -> Dict:
         """获取大单交易数据"""
         try:
-            url = f"http://push2.eastmoney.com/api/qt/stock/get?secid={symbol}&fields=f19,f20,f21,f22"
-            data = await self.anti_crawler.make_request(url)
+            url = EASTMONEY_BIG_DEALS_URL.format(symbol)
+            data = await self._fetch(url)
             if data:
                 return self._parse_big_deals(data)
             return {}
@@ -351,14 +438,14 @@ class TradeDataScraper:
     async def _get_top_traders(self, symbol: str) -> Dict:
         """获取龙虎榜数据"""
         try:
-            url = f"http://data.eastmoney.com/stock/lhb,{symbol}.html"
-            html = await self.anti_crawler.make_request(url)
+            url = EASTMONEY_TOP_TRADERS_URL.format(symbol)
+            html = await self._fetch(url)
             if html:
-                soup = BeautifulSoup(html, 'lxml')
+                root = _parse_html(html)
                 
                 # 获取买入和卖出前5名
-                buy_elements = soup.select(".tab1 tr")
-                sell_elements = soup.select(".tab2 tr")
+                buy_elements = TOP_TRADERS_BUY_ROWS(root)
+                sell_elements = TOP_TRADERS_SELL_ROWS(root)
                 
                 buy_data = []
                 sell_data = []
@@ -366,11 +453,11 @@ class TradeDataScraper:
                 # 解析买入数据
                 for element in buy_elements[1:6]:  # 跳过表头
                     try:
-                        cols = element.find_all("td")
+                        cols = element.findall(".//td")
                         buy_data.append({
-                            'trader_name': cols[1].text.strip(),
-                            'buy_amount': cols[2].text.strip(),
-                            'buy_ratio': cols[3].text.strip()
+                            'trader_name': cols[1].text_content().strip(),
+                            'buy_amount': cols[2].text_content().strip(),
+                            'buy_ratio': cols[3].text_content().strip()
                         })
                     except:
                         continue
@@ -378,11 +465,11 @@ class TradeDataScraper:
                 # 解析卖出数据
                 for element in sell_elements[1:6]:  # 跳过表头
                     try:
-                        cols = element.find_all("td")
+                        cols = element.findall(".//td")
                         sell_data.append({
-                            'trader_name': cols[1].text.strip(),
-                            'sell_amount': cols[2].text.strip(),
-                            'sell_ratio': cols[3].text.strip()
+                            'trader_name': cols[1].text_content().strip(),
+                            'sell_amount': cols[2].text_content().strip(),
+                            'sell_ratio': cols[3].text_content().strip()
                         })
                     except:
                         continue
@@ -1,13 +1,24 @@
 import os
-import json
 import shutil
+import tempfile
+import orjson
 from typing import Dict, Any
 from django.conf import settings
 from dc_core.models import Dataset
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd帧头魔数，用于识别压缩存储的数据文件
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
 class DatasetStorage:
     """数据集存储管理器"""
     
+    COMPRESS_THRESHOLD = 1024 * 1024  # 超过1MB的数据在zstandard可用时压缩存储
+    
     def __init__(self):
         self.storage_path = settings.DATASET_STORAGE_PATH
         os.makedirs(self.storage_path, exist_ok=True)
@@ -18,10 +29,24 @@ class DatasetStorage:
         dataset_dir = self._get_dataset_dir(dataset)
         os.makedirs(dataset_dir, exist_ok=True)
         
-        # 保存数据文件
+        payload = orjson.dumps(content, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        if zstandard is not None and len(payload) > self.COMPRESS_THRESHOLD:
+            payload = zstandard.ZstdCompressor(level=3).compress(payload)
+        
+        # 先写入各自独立的临时文件并落盘后再原子替换，避免并发保存互相覆盖或断电时留下不完整的数据文件
         file_path = os.path.join(dataset_dir, 'data.json')
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(content, f, ensure_ascii=False, indent=2)
+        fd, tmp_path = tempfile.mkstemp(dir=dataset_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)  # mkstemp创建的文件仅限所有者读写，保持与直接写入时相同的权限
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         
         return file_path
     
@@ -32,8 +57,15 @@ class DatasetStorage:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"数据集文件不存在: {file_path}")
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            payload = f.read()
+        
+        if payload.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise RuntimeError(f"数据集文件已压缩，需要安装zstandard: {file_path}")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        
+        return orjson.loads(payload)
     
     def delete_dataset(self, dataset: Dataset) -> None:
         """删除数据集文件"""
@@ -0,0 +1 @@
+# dc_core utils package 
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""
+JIT编译工具
+numba可用时编译数值计算内核，不可用时退化为普通Python函数
+"""
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+def njit(*args, **kwargs):
+    """numba.njit的兼容封装，支持 @njit 和 @njit(...) 两种写法"""
+    if NUMBA_AVAILABLE:
+        return numba.njit(*args, **kwargs)
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda func: func
+
+# 并行循环：numba不可用时使用内置range
+prange = numba.prange if NUMBA_AVAILABLE else range
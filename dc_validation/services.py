@@ -1,35 +1,186 @@
-from typing import Dict, List, Any
+import logging
+from typing import Dict, List, Any, Tuple
 import pandas as pd
 import numpy as np
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Avg
+from django.db.models.expressions import RawSQL
 from dc_core.models import Dataset, DataQualityMetric
+from dc_core.utils.jit import njit, prange, NUMBA_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+if NUMBA_AVAILABLE:
+    from numba import types
+    # 数值块为只读、任意内存布局的float32二维数组：pandas的to_numpy可能返回只读视图，单列时布局为C
+    _BLOCK_SIGNATURE = types.Tuple((types.float64[::1], types.float64[::1]))(
+        types.Array(types.float32, 2, 'A', readonly=True)
+    )
+else:
+    _BLOCK_SIGNATURE = None
+
+# 质量内核声明签名，在模块导入时即编译（或从磁盘缓存加载），首个请求不再承担编译开销
+@njit('float64(float64[::1])', cache=True)
+def _normalized_entropy(counts: np.ndarray) -> float:
+    """根据各类别的计数计算归一化熵值（0~1）"""
+    k = counts.shape[0]
+    if k <= 1:
+        return 0.0
+    
+    total = 0.0
+    for i in range(k):
+        total += counts[i]
+    
+    entropy = 0.0
+    for i in range(k):
+        p = counts[i] / total
+        entropy -= p * np.log2(p)
+    return entropy / np.log2(k)
+
+def _str_lengths(series: pd.Series) -> pd.Series:
+    """计算字符串长度，空值为NaN；pyarrow可用时由Arrow的C内核计算，否则使用pandas的str访问器"""
+    if pa is not None:
+        try:
+            values = pa.array(series, type=pa.string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # 混有非字符串元素时交给pandas处理（这些元素的长度为NaN）
+            pass
+        else:
+            lengths = pc.utf8_length(values).to_numpy(zero_copy_only=False)
+            return pd.Series(lengths, index=series.index, dtype=np.float64)
+    return series.str.len()
+
+def _decimal_lengths(text: pd.Series) -> pd.Series:
+    """计算数值字符串小数点后的位数，不含小数点的为NaN"""
+    if pa is not None:
+        values = pa.array(text, type=pa.string(), from_pandas=True)
+        point = pc.find_substring(values, '.')
+        digits = pc.if_else(
+            pc.greater_equal(point, 0),
+            pc.subtract(pc.subtract(pc.utf8_length(values), point), 1),
+            pa.scalar(None, pa.int32())
+        )
+        return pd.Series(digits.to_numpy(zero_copy_only=False), index=text.index, dtype=np.float64)
+    return text.str.split('.').str[1].str.len()
+
+@njit(_BLOCK_SIGNATURE, parallel=True, cache=True)
+def _numeric_block_ratios(block: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按列计算数值块（行×列，空值为NaN）的非异常值比例和四分位范围内比例
+    
+    各列并行处理，一列内依次求均值、样本标准差和四分位数（线性插值），
+    再用一次遍历同时统计Z分数>3的异常值和落在[Q1-1.5IQR, Q3+1.5IQR]内的元素；
+    空值不参与统计但计入总行数，有效值少于2个的列视为全部准确
+    
+    Returns:
+        (accuracy_ratios, range_ratios)
+    """
+    total, n_columns = block.shape
+    accuracy_ratios = np.ones(n_columns)
+    range_ratios = np.zeros(n_columns)
+    
+    for j in prange(n_columns):
+        column = block[:, j]
+        valid = np.sort(column[~np.isnan(column)])
+        n = valid.shape[0]
+        if n == 0:
+            continue
+        
+        mean = 0.0
+        for i in range(n):
+            mean += valid[i]
+        mean /= n
+        
+        sq_sum = 0.0
+        for i in range(n):
+            sq_sum += (valid[i] - mean) ** 2
+        std = np.sqrt(sq_sum / (n - 1)) if n >= 2 else 0.0
+        
+        quartiles = np.empty(2)
+        for k in range(2):
+            pos = (0.25, 0.75)[k] * (n - 1)
+            lower = int(np.floor(pos))
+            upper = min(lower + 1, n - 1)
+            quartiles[k] = valid[lower] + (valid[upper] - valid[lower]) * (pos - lower)
+        iqr = quartiles[1] - quartiles[0]
+        lower_bound = quartiles[0] - 1.5 * iqr
+        upper_bound = quartiles[1] + 1.5 * iqr
+        
+        outliers = 0
+        inliers = 0
+        for i in range(n):
+            if std > 0 and abs(valid[i] - mean) > 3 * std:
+                outliers += 1
+            if lower_bound <= valid[i] <= upper_bound:
+                inliers += 1
+        
+        accuracy_ratios[j] = 1.0 - outliers / total
+        range_ratios[j] = inliers / total
+    
+    return accuracy_ratios, range_ratios
 
 class DataQualityService:
     """数据质量评估服务"""
     
+    # 按dtype.kind分派检查，分别与pd.api.types.is_numeric_dtype及select_dtypes(np.number)的判定一致
+    NUMERIC_KINDS = frozenset('biufc')
+    RANGE_KINDS = frozenset('iufcm')
+    
+    QUALITY_CACHE_TTL = 24 * 3600  # 缓存键包含数据集更新时间，数据集变化后自动失效
+    
     def evaluate_dataset(self, dataset: Dataset) -> float:
         """评估数据集质量"""
-        try:
-            # 计算各项质量指标
-            completeness = self._evaluate_completeness(self._load_dataset_data(dataset))
-            consistency = self._evaluate_consistency(self._load_dataset_data(dataset))
-            accuracy = self._evaluate_accuracy(self._load_dataset_data(dataset))
-            
-            # 计算总分
-            total_score = (completeness + consistency + accuracy) / 3
+        return self.evaluate_datasets([dataset])[0]
+    
+    def evaluate_datasets(self, datasets: List[Dataset]) -> List[float]:
+        """批量评估数据集质量，各数据集的质量指标记录一次性批量写入
+        
+        Returns:
+            与datasets顺序对应的总分列表，评估失败的数据集为0.0
+        """
+        total_scores = []
+        records = []
+        for dataset in datasets:
+            try:
+                # 计算各项质量指标，数据集未更新时复用缓存的结果
+                cache_key = f"dataset_quality:{dataset.id}:{dataset.updated_at.timestamp()}"
+                quality_cache = caches['quality']
+                scores = quality_cache.get(cache_key)
+                if scores is None:
+                    scores = self._evaluate_columns(self._load_dataset_data(dataset))
+                    quality_cache.set(cache_key, scores, self.QUALITY_CACHE_TTL)
+                completeness, consistency, accuracy = scores
+                
+                # 计算总分
+                total_score = (completeness + consistency + accuracy) / 3
+            except Exception as e:
+                logger.error(f"质量评估失败: {str(e)}")
+                total_scores.append(0.0)
+                continue
             
-            # 创建质量指标记录
-            DataQualityMetric.objects.create(
+            total_scores.append(total_score)
+            records.append(DataQualityMetric(
                 dataset=dataset,
                 completeness_score=completeness,
                 consistency_score=consistency,
                 accuracy_score=accuracy,
                 total_score=total_score
-            )
-            
-            return total_score
+            ))
+        
+        # 创建质量指标记录
+        try:
+            DataQualityMetric.objects.bulk_create(records, batch_size=500)
         except Exception as e:
-            print(f"质量评估失败: {str(e)}")
-            return 0.0
+            logger.error(f"质量评估失败: {str(e)}")
+            return [0.0] * len(total_scores)
+        
+        return total_scores
     
     def _load_dataset(self, dataset: Dataset) -> pd.DataFrame:
         """加载数据集"""
@@ -51,62 +202,64 @@ class DataQualityService:
         if data.empty:
             return 0.0
         
-        # 计算每列的完整性
-        column_completeness = []
-        for column in data.columns:
-            non_null_count = data[column].count()
-            total_count = len(data)
-            column_completeness.append(non_null_count / total_count)
-        
-        # 计算整体完整性
-        return np.mean(column_completeness) * 100
+        # 各列行数相同，各列完整性的均值即整体非空比例
+        return float(data.notna().to_numpy().mean() * 100)
     
-    def _evaluate_accuracy(self, data: pd.DataFrame) -> float:
-        """评估数据准确性"""
+    def _evaluate_columns(self, data: pd.DataFrame) -> Tuple[float, float, float]:
+        """单次遍历各列，同时评估数据完整性、一致性和准确性
+        
+        Returns:
+            (completeness, consistency, accuracy)
+        """
         if data.empty:
-            return 0.0
+            return 0.0, 0.0, 0.0
+        
+        categorical_columns = set(data.select_dtypes(include=['object']).columns)
+        
+        # 数值列组成一个二维数组，按列一次性计算异常值比例和四分位范围内比例
+        numeric_columns = [
+            column for column, dtype in data.dtypes.items()
+            if dtype.kind in self.NUMERIC_KINDS or dtype.kind in self.RANGE_KINDS
+        ]
+        # 按列存储，使内核逐列访问连续内存；质量分数无需双精度，
+        # 以float32传入可减半内存读写，内核中的累加仍使用float64
+        block = np.asfortranarray(data[numeric_columns].to_numpy(dtype=np.float32, na_value=np.nan))
+        accuracy_ratios, range_ratios = _numeric_block_ratios(block)
+        numeric_accuracy = dict(zip(numeric_columns, accuracy_ratios))
+        numeric_range = dict(zip(numeric_columns, range_ratios))
         
         accuracy_scores = []
+        format_scores = []
+        range_scores = []
+        category_scores = []
         
-        for column in data.columns:
-            # 获取列的数据类型
-            dtype = data[column].dtype
+        for column, dtype in data.dtypes.items():
+            series = data[column]
+            kind = dtype.kind
             
             # 对不同类型的数据进行准确性检查
-            if pd.api.types.is_numeric_dtype(dtype):
+            if kind in self.NUMERIC_KINDS:
                 # 数值型数据：检查异常值
-                accuracy_scores.append(self._check_numeric_accuracy(data[column]))
-            elif pd.api.types.is_datetime64_dtype(dtype):
+                accuracy_scores.append(numeric_accuracy[column])
+            elif kind == 'M' and isinstance(dtype, np.dtype):
                 # 日期型数据：检查日期有效性
-                accuracy_scores.append(self._check_datetime_accuracy(data[column]))
+                accuracy_scores.append(self._check_datetime_accuracy(series))
             else:
                 # 字符串数据：检查格式一致性
-                accuracy_scores.append(self._check_string_accuracy(data[column]))
-        
-        return np.mean(accuracy_scores) * 100
-    
-    def _evaluate_consistency(self, data: pd.DataFrame) -> float:
-        """评估数据一致性"""
-        if data.empty:
-            return 0.0
-        
-        consistency_scores = []
-        
-        # 检查数据格式一致性
-        for column in data.columns:
-            consistency_scores.append(self._check_format_consistency(data[column]))
-        
-        # 检查数值范围一致性
-        numeric_columns = data.select_dtypes(include=[np.number]).columns
-        for column in numeric_columns:
-            consistency_scores.append(self._check_range_consistency(data[column]))
+                accuracy_scores.append(self._check_string_accuracy(series))
+            
+            # 检查数据格式、数值范围及类别值的一致性
+            format_scores.append(self._check_format_consistency(series))
+            if kind in self.RANGE_KINDS:
+                range_scores.append(numeric_range[column])
+            if column in categorical_columns:
+                category_scores.append(self._check_category_consistency(series))
         
-        # 检查类别值一致性
-        categorical_columns = data.select_dtypes(include=['object']).columns
-        for column in categorical_columns:
-            consistency_scores.append(self._check_category_consistency(data[column]))
+        completeness = self._evaluate_completeness(data)
+        consistency = np.mean(format_scores + range_scores + category_scores) * 100
+        accuracy = np.mean(accuracy_scores) * 100
         
-        return np.mean(consistency_scores) * 100
+        return completeness, consistency, accuracy
     
     def _evaluate_timeliness(self, dataset: Dataset) -> float:
         """评估数据时效性"""
@@ -126,32 +279,28 @@ class DataQualityService:
         # 获取项目的性能记录
         performances = dataset.performances.all()
         
-        if not performances:
-            return 50.0  # 没有性能记录时返回中等分数
-        
-        # 计算平均性能提升
-        performance_improvements = []
-        for perf in performances:
+        if connections[performances.db].vendor == 'postgresql':
+            # 在数据库中计算每条记录各项指标的均值及其总体均值，只返回一行结果
+            relevance_score = performances.annotate(
+                improvement=RawSQL("(SELECT avg(value::float) FROM jsonb_each_text(metrics))", [])
+            ).aggregate(score=Avg('improvement'))['score']
+            if relevance_score is None:
+                return 50.0  # 没有性能记录时返回中等分数
+        else:
+            # 只取metrics列，不构建模型实例
+            metrics_list = list(performances.values_list('metrics', flat=True))
+            if not metrics_list:
+                return 50.0  # 没有性能记录时返回中等分数
+            
+            # 计算平均性能提升
             # 这里应该实现更复杂的性能提升计算逻辑
-            improvement = sum(perf.metrics.values()) / len(perf.metrics)
-            performance_improvements.append(improvement)
+            relevance_score = np.mean([sum(metrics.values()) / len(metrics) for metrics in metrics_list])
         
         # 归一化相关性得分
-        relevance_score = np.mean(performance_improvements)
         normalized_score = min(100, max(0, relevance_score * 100))
         
         return normalized_score
     
-    def _check_numeric_accuracy(self, series: pd.Series) -> float:
-        """检查数值准确性"""
-        # 计算Z分数
-        z_scores = np.abs((series - series.mean()) / series.std())
-        
-        # 统计异常值比例（Z分数>3的视为异常值）
-        outlier_ratio = (z_scores > 3).mean()
-        
-        return 1 - outlier_ratio
-    
     def _check_datetime_accuracy(self, series: pd.Series) -> float:
         """检查日期准确性"""
         # 检查日期是否在合理范围内
@@ -164,7 +313,7 @@ class DataQualityService:
     def _check_string_accuracy(self, series: pd.Series) -> float:
         """检查字符串准确性"""
         # 检查字符串长度的一致性
-        lengths = series.str.len()
+        lengths = _str_lengths(series)
         mean_length = lengths.mean()
         std_length = lengths.std()
         
@@ -183,46 +332,25 @@ class DataQualityService:
         # 获取最常见的格式
         if pd.api.types.is_numeric_dtype(series.dtype):
             # 对于数值型，检查小数位数
-            decimals = non_null.astype(str).str.split('.').str[1].str.len()
+            decimals = _decimal_lengths(non_null.astype(str))
             most_common_format = decimals.mode()[0]
             consistency_ratio = (decimals == most_common_format).mean()
         else:
             # 对于字符串，检查格式模式
-            patterns = non_null.astype(str).str.len()
+            patterns = _str_lengths(non_null.astype(str))
             most_common_format = patterns.mode()[0]
             consistency_ratio = (patterns == most_common_format).mean()
         
         return consistency_ratio
     
-    def _check_range_consistency(self, series: pd.Series) -> float:
-        """检查数值范围一致性"""
-        # 计算四分位数范围
-        q1 = series.quantile(0.25)
-        q3 = series.quantile(0.75)
-        iqr = q3 - q1
-        
-        # 定义异常值范围
-        lower_bound = q1 - 1.5 * iqr
-        upper_bound = q3 + 1.5 * iqr
-        
-        # 计算在正常范围内的数据比例
-        normal_range_ratio = series.between(lower_bound, upper_bound).mean()
-        
-        return normal_range_ratio
-    
     def _check_category_consistency(self, series: pd.Series) -> float:
         """检查类别值一致性"""
-        # 计算类别值的分布
-        value_counts = series.value_counts(normalize=True)
-        
-        # 计算熵值（越低表示一致性越高）
-        entropy = -np.sum(value_counts * np.log2(value_counts))
-        max_entropy = np.log2(len(value_counts))
-        
-        # 归一化熵值到[0,1]区间
-        normalized_entropy = entropy / max_entropy if max_entropy > 0 else 0
+        # 计算类别值的分布：编码后按编码计数，空值编码为-1不参与统计
+        codes, _ = pd.factorize(series, sort=False)
+        counts = np.bincount(codes[codes >= 0]).astype(np.float64)
         
-        return 1 - normalized_entropy
+        # 归一化熵值到[0,1]区间（越低表示一致性越高）
+        return 1 - _normalized_entropy(counts)
 
     def validate_schema(self, data: List[Dict], expected_schema: Dict) -> Dict:
         """验证数据模式"""
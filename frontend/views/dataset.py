@@ -8,7 +8,8 @@ class DatasetDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        dataset = self.get_object()
+        # DetailView.get已加载数据集，直接复用，避免再次查询
+        dataset = self.object
         
         # 获取数据预览
         processor = DataProcessor(dataset)
@@ -1,3 +1,4 @@
+from django.db.models import Count
 from django.views.generic import TemplateView
 from core.models import Project
 
@@ -6,5 +7,11 @@ class ProjectDashboardView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['projects'] = Project.objects.filter(owner=self.request.user)
+        # 只取卡片展示的字段，数据集和任务数量在同一查询中统计，避免逐个项目执行count查询
+        context['projects'] = Project.objects.filter(
+            owner=self.request.user
+        ).only('id', 'name', 'description').annotate(
+            dataset_count=Count('dataset', distinct=True),
+            task_count=Count('task', distinct=True)
+        )
         return context 
\ No newline at end of file
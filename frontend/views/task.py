@@ -13,7 +13,8 @@ class TaskMonitorView(ListView):
         
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['active_tasks'] = self.get_queryset().filter(
-            status__in=['PENDING', 'RUNNING']
-        )
+        # 从已加载的任务列表中筛选活动任务，模板遍历tasks时复用同一查询结果，不再单独查询
+        context['active_tasks'] = [
+            task for task in self.object_list if task.status in ('PENDING', 'RUNNING')
+        ]
         return context 
\ No newline at end of file
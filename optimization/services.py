@@ -1,7 +1,7 @@
 from typing import Dict, Any
 import pandas as pd
 from core.models import Dataset
-from evaluation.services import PerformanceEvaluator
+from evaluation.services import PerformanceEvaluator, read_dataset_csv
 
 class DatasetOptimizer:
     """数据集优化服务"""
@@ -11,7 +11,8 @@ class DatasetOptimizer:
         
     def optimize_for_agent(self, agent_performance: Dict[str, float]) -> Dataset:
         """优化数据集以提升智能体性能"""
-        df = pd.read_csv(self.dataset.file_path)
+        # 缓存的DataFrame为共享对象，优化策略会改写数据，先复制一份
+        df = read_dataset_csv(self.dataset).copy()
         
         # 应用优化策略
         df = self._balance_classes(df)
@@ -1,7 +1,15 @@
 import os
 import sys
+import asyncio
+import pytest
 import django
 from django.conf import settings
+from django.test import override_settings
+
+try:
+    import uvloop
+except ImportError:  # uvloop不支持Windows，缺失时使用标准事件循环
+    uvloop = None
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -49,4 +57,29 @@ def pytest_configure():
             },
             SECRET_KEY='test-key-not-for-production',
         )
-        django.setup() 
\ No newline at end of file
+        django.setup()
+    elif not os.getenv('SECRET_KEY'):
+        # config.settings从环境变量读取SECRET_KEY，未配置时为空，处理请求时消息中间件的Cookie签名会报错
+        settings.SECRET_KEY = 'test-key-not-for-production'
+
+
+@pytest.fixture(scope='session', autouse=True)
+def worker_cache():
+    """使用进程内缓存，pytest-xdist的各个worker互不共享缓存目录，清空缓存时不会影响其他worker"""
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'binance': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'binance'},
+        'quality': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'quality'}
+    }):
+        yield
+
+
+def pytest_asyncio_loop_factories(config, item):
+    """pytest-asyncio运行的异步测试使用uvloop事件循环，未安装uvloop时使用标准事件循环
+    
+    只作用于pytest-asyncio直接运行的异步测试函数。Django测试类中的异步方法由async_to_sync执行，
+    仍使用标准事件循环；目前仓库中的异步测试都属于这种情况
+    """
+    if uvloop is None:
+        return {'asyncio': asyncio.new_event_loop}
+    return {'uvloop': uvloop.new_event_loop}
@@ -1,47 +1,41 @@
 import pytest
-from django.test import TestCase
-from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
-User = get_user_model()
+WORKFLOW_CASES = [
+    # (认证头, 请求前是否清除认证信息, 请求方法, 路径, 期望状态码)
+    (None, False, 'get', '/api/v1/', 401),                        # 未认证访问
+    ('Token {token}', False, 'get', '/api/v1/', 200),             # 使用令牌认证
+    ('Token {token}', False, 'post', '/api/v1/restricted/', 401),  # 受限资源访问
+    ('Token {token}', True, 'get', '/api/v1/', 401),              # 注销后清除认证信息
+    ('Token invalid-token', False, 'get', '/api/v1/', 401),       # 错误的认证信息
+]
 
-@pytest.mark.integration
-class WorkflowTests(TestCase):
-    def setUp(self):
-        """测试前准备工作"""
-        super().setUp()
-        self.user = User.objects.create_user(
-            username='testuser',
-            password='testpass'
-        )
-        self.client = APIClient()
-        
-        # 创建认证令牌
-        self.token = Token.objects.create(user=self.user)
+@pytest.fixture
+def api_client():
+    """未携带认证信息的API客户端"""
+    return APIClient()
+
+@pytest.fixture
+def token(db, django_user_model):
+    """测试用户的认证令牌"""
+    user = django_user_model.objects.create_user(
+        username='testuser',
+        password='testpass'
+    )
+    return Token.objects.create(user=user)
 
-    def test_complete_workflow(self):
-        """测试完整工作流程"""
-        # 测试未认证访问
-        self.client.logout()  # 确保未认证状态
-        response = self.client.get('/api/v1/')
-        self.assertEqual(response.status_code, 401)
-        
-        # 测试使用令牌认证
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
-        response = self.client.get('/api/v1/')
-        self.assertEqual(response.status_code, 200)
-        
-        # 测试受限资源访问
-        response = self.client.post('/api/v1/restricted/')
-        self.assertEqual(response.status_code, 401)
-        
-        # 测试注销
-        self.client.credentials()  # 清除认证信息
-        response = self.client.get('/api/v1/')
-        self.assertEqual(response.status_code, 401)
-        
-        # 使用错误的认证信息访问
-        self.client.credentials(HTTP_AUTHORIZATION='Token invalid-token')
-        response = self.client.get('/api/v1/')
-        self.assertEqual(response.status_code, 401) 
\ No newline at end of file
+@pytest.mark.integration
+@pytest.mark.parametrize(
+    'header,logout,method,path,expected',
+    WORKFLOW_CASES,
+    ids=['anonymous', 'token', 'restricted', 'logout', 'invalid_token']
+)
+def test_workflow_auth(api_client, token, header, logout, method, path, expected):
+    """测试工作流程中各认证场景，每个场景作为单独的用例运行和报告"""
+    if header:
+        api_client.credentials(HTTP_AUTHORIZATION=header.format(token=token.key))
+    if logout:
+        api_client.credentials()  # 清除之前设置的有效令牌
+    response = getattr(api_client, method)(path)
+    assert response.status_code == expected
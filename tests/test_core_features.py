@@ -1,12 +1,15 @@
 import unittest
-from unittest.mock import patch, MagicMock, AsyncMock
+from unittest.mock import patch, MagicMock
 import json
-from datetime import datetime
-from django.test import TestCase
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from django.test import TestCase, SimpleTestCase, override_settings
 from dc_core.services.requirement_analysis import RequirementAnalysisService
 from dc_collector.services.enhanced_collector import EnhancedDataCollector as EnhancedCollector, DataSourceConfig
 from dc_core.models import Dataset
-from dc_core.storage import DatasetStorage
+from dc_core.storage import DatasetStorage, zstandard
 from dc_core.services.quality_manager import DataQualityManager
 from dc_core.services.ai_enhancer import AIEnhancer
 import aiohttp
@@ -14,33 +17,71 @@ import sqlite3
 import pytest
 import pandas as pd
 
-class RequirementAnalysisTests(TestCase):
+def _chat_response(content: str) -> SimpleNamespace:
+    """构造OpenAI聊天补全响应的替身对象，被测代码只读取choices[0].message.content"""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+# 各测试共用的OpenAI响应，模块加载时构造一次
+_CRYPTO_REQUIREMENT_RESPONSE = _chat_response(json.dumps({
+    "data_type": "cryptocurrency",
+    "timeframe": "last_week",
+    "fields": ["price", "volume"],
+    "frequency": "daily",
+    "format": "json",
+    "source_type": "api"
+}))
+_CRYPTO_FIELDS_RESPONSE = _chat_response(json.dumps({
+    "data_type": "cryptocurrency",
+    "timeframe": "last_week",
+    "fields": ["price", "volume"]
+}))
+_ANALYSIS_RESPONSE = _chat_response('{"analysis": {"data_type": "user_behavior", "complexity": "medium"}}')
+_DATA_SOURCES_RESPONSE = _chat_response('[{"name": "用户行为数据库", "type": "database", "url": "example.com"}]')
+
+class _StubResponse:
+    """aiohttp响应的替身，返回预设的JSON数据"""
+    
+    status = 200
+    
+    def __init__(self, payload):
+        self._payload = payload
+    
+    async def raise_for_status(self):
+        pass
+    
+    async def json(self):
+        return self._payload
+
+class _StubSession:
+    """aiohttp.ClientSession的替身，get请求返回预设的响应"""
+    
+    def __init__(self, payload):
+        self._payload = payload
+    
+    async def get(self, url, **kwargs):
+        return _StubResponse(self._payload)
+    
+    async def close(self):
+        pass
+
+class RequirementAnalysisTests(SimpleTestCase):
     """需求分析服务测试"""
     
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 替换OpenAI客户端类，创建服务时不再构造真实的HTTP客户端，各测试再按需设置返回值
+        patcher = patch('dc_core.services.requirement_analysis.OpenAI')
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+    
     def setUp(self):
         self.service = RequirementAnalysisService()
         
     def test_analyze_requirement(self):
         """测试需求分析"""
-        # 模拟OpenAI响应
-        mock_response = MagicMock()
-        mock_response.choices = [
-            MagicMock(
-                message=MagicMock(
-                    content=json.dumps({
-                        "data_type": "cryptocurrency",
-                        "timeframe": "last_week",
-                        "fields": ["price", "volume"],
-                        "frequency": "daily",
-                        "format": "json",
-                        "source_type": "api"
-                    })
-                )
-            )
-        ]
-        
         # 使用mock替换OpenAI客户端的方法
-        self.service.openai_client.chat.completions.create = MagicMock(return_value=mock_response)
+        self.service.openai_client.chat.completions.create = MagicMock(return_value=_CRYPTO_REQUIREMENT_RESPONSE)
         
         # 测试需求分析
         result = self.service.analyze_requirement(
@@ -51,7 +92,27 @@ class RequirementAnalysisTests(TestCase):
         self.assertEqual(result["data_type"], "cryptocurrency")
         self.assertEqual(result["timeframe"], "last_week")
         self.assertListEqual(result["fields"], ["price", "volume"])
+    
+    def test_analyze_requirement_cached(self):
+        """测试相同需求命中缓存时不再调用OpenAI"""
+        cached_result = {
+            "data_type": "cryptocurrency",
+            "timeframe": "last_week",
+            "fields": ["price", "volume"],
+            "frequency": "once",
+            "format": "json"
+        }
+        self.service.redis_client = MagicMock()
+        self.service.redis_client.get.return_value = json.dumps(cached_result)
+        self.service.openai_client.chat.completions.create = MagicMock()
         
+        result = self.service.analyze_requirement(
+            "I need Bitcoin price and volume data for the last week"
+        )
+        
+        self.assertEqual(result, cached_result)
+        self.service.openai_client.chat.completions.create.assert_not_called()
+    
     def test_validate_requirement(self):
         """测试需求验证"""
         # 有效需求
@@ -69,7 +130,7 @@ class RequirementAnalysisTests(TestCase):
         }
         self.assertFalse(self.service.validate_requirement(invalid_req))
 
-class EnhancedDataCollectorTests(TestCase):
+class EnhancedDataCollectorTests(SimpleTestCase):
     """增强型数据采集器测试"""
     
     def setUp(self):
@@ -87,74 +148,83 @@ class EnhancedDataCollectorTests(TestCase):
             'format': 'json'
         })
         
-        # 创建mock响应
-        mock_response = MagicMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value={
+        # 模拟API响应
+        stub_session = _StubSession({
             'data': [
                 {'id': 1, 'value': 'test1'},
                 {'id': 2, 'value': 'test2'}
             ]
         })
-        mock_response.raise_for_status = AsyncMock()
         
-        # 创建mock会话
-        mock_session = MagicMock()
-        mock_session.get = AsyncMock(return_value=mock_response)
-        mock_session.close = AsyncMock()
-        
-        with patch('aiohttp.ClientSession', return_value=mock_session):
+        with patch('aiohttp.ClientSession', return_value=stub_session):
             data = await self.collector.collect_from_api(config)
             self.assertEqual(len(data['data']), 2)
             self.assertEqual(data['data'][0]['value'], 'test1')
-        
-    def test_clean_data(self):
-        """测试数据清洗"""
-        # 测试数据
-        raw_data = [
-            {"price": 50000, "volume": 1000, "extra": "value1"},
-            {"price": 50000, "volume": 1000, "extra": "value2"},  # 重复行
-            {"price": None, "volume": 1200, "extra": "value3"}
-        ]
-        
-        # 指定字段
-        fields = ["price", "volume"]
-        
-        # 清洗数据
-        cleaned_data = self.collector.clean_data(raw_data, fields)
-        
-        # 验证结果
-        self.assertEqual(len(cleaned_data), 2)  # 应该删除重复行
-        self.assertNotIn("extra", cleaned_data[0])  # 应该只包含指定字段
-        self.assertIsNotNone(cleaned_data[1]["price"])  # 应该处理缺失值
-        
-    def test_validate_data_privacy(self):
-        """测试隐私合规性验证"""
-        # 安全数据
-        safe_data = [
-            {"price": 50000, "volume": 1000},
-            {"timestamp": "2024-01-01", "value": 100}
-        ]
-        self.assertTrue(self.collector.validate_data_privacy(safe_data))
-        
-        # 包含敏感信息的数据
-        unsafe_data = [
-            {"price": 50000, "email": "user@example.com"},
-            {"phone": "1234567890", "value": 100}
-        ]
-        self.assertFalse(self.collector.validate_data_privacy(unsafe_data))
+
+@pytest.fixture(scope='module')
+def collector():
+    """数据清洗和隐私验证不修改采集器状态，整个模块共用一个实例"""
+    return EnhancedCollector()
+
+@pytest.mark.parametrize('raw_data,fields,expected_len', [
+    # 删除重复行，只保留指定字段并填充缺失值
+    ([
+        {"price": 50000, "volume": 1000, "extra": "value1"},
+        {"price": 50000, "volume": 1000, "extra": "value2"},
+        {"price": None, "volume": 1200, "extra": "value3"}
+    ], ["price", "volume"], 2),
+    # 无重复行
+    ([
+        {"price": 50000, "volume": 1000},
+        {"price": 51000, "volume": 1100},
+        {"price": 52000, "volume": 1200}
+    ], ["price", "volume"], 3),
+    # 全部重复
+    ([{"price": 50000, "volume": 1000}] * 3, ["price", "volume"], 1),
+    # 未指定字段时保留全部字段，extra不同的行不视为重复
+    ([
+        {"price": 50000, "extra": "value1"},
+        {"price": 50000, "extra": "value2"}
+    ], [], 2),
+], ids=['duplicate_and_missing', 'distinct', 'all_duplicates', 'all_fields'])
+def test_clean_data(collector, raw_data, fields, expected_len):
+    """测试数据清洗"""
+    cleaned_data = collector.clean_data(raw_data, fields)
+    
+    assert len(cleaned_data) == expected_len
+    expected_fields = set(fields or raw_data[0])
+    assert all(set(row) == expected_fields for row in cleaned_data)  # 只包含指定字段
+    assert all(pd.notna(value) for row in cleaned_data for value in row.values())  # 缺失值已填充
+
+@pytest.mark.parametrize('data,expected', [
+    ([{"price": 50000, "volume": 1000}, {"timestamp": "2024-01-01", "value": 100}], True),
+    ([{"price": 50000, "email": "user@example.com"}, {"phone": "1234567890", "value": 100}], False),
+    ([{"value": 100}, {"Password": "secret"}], False),  # 字段名不区分大小写
+    ([], True),
+], ids=['safe', 'email_and_phone', 'case_insensitive', 'empty'])
+def test_validate_data_privacy(collector, data, expected):
+    """测试隐私合规性验证"""
+    assert collector.validate_data_privacy(data) is expected
 
 class DatasetStorageTests(TestCase):
     """数据集存储测试"""
     
-    def setUp(self):
-        self.storage = DatasetStorage()
-        self.dataset = Dataset.objects.create(
+    @classmethod
+    def setUpTestData(cls):
+        # 数据集记录每个测试类只创建一次，各测试方法获得其副本
+        cls.dataset = Dataset.objects.create(
             name="test_dataset",
             description="Test dataset",
             format="json"
         )
         
+    def setUp(self):
+        # 数据集文件写入临时目录，避免在仓库的datasets目录下留下测试产物
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        with override_settings(DATASET_STORAGE_PATH=tmpdir.name):
+            self.storage = DatasetStorage()
+        
     def test_save_and_load_dataset(self):
         """测试数据集保存和加载"""
         # 测试数据
@@ -165,7 +235,7 @@ class DatasetStorageTests(TestCase):
             ],
             "metadata": {
                 "source": "test",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": "2024-01-01T00:00:00"
             }
         }
         
@@ -178,6 +248,42 @@ class DatasetStorageTests(TestCase):
         self.assertEqual(len(loaded_data["data"]), 2)
         self.assertEqual(loaded_data["data"][0]["price"], 50000)
         
+    def test_save_dataset_with_numpy_values(self):
+        """测试保存包含numpy数值和中文内容的数据集"""
+        test_data = {
+            "data": pd.DataFrame({"price": [50000.5, 51000.0]})["price"].to_numpy(),
+            "metadata": {"source": "测试", 1: "non-str key"}
+        }
+        
+        self.storage.save_dataset(self.dataset, test_data)
+        
+        loaded_data = self.storage.load_dataset(self.dataset)
+        self.assertEqual(loaded_data["data"], [50000.5, 51000.0])
+        self.assertEqual(loaded_data["metadata"], {"source": "测试", "1": "non-str key"})
+        
+    @unittest.skipIf(zstandard is None, "zstandard未安装")
+    def test_save_and_load_compressed_dataset(self):
+        """测试超过阈值的数据集压缩存储"""
+        test_data = {"data": [{"price": 50000 + i, "volume": 1000} for i in range(100)]}
+        
+        with patch.object(DatasetStorage, 'COMPRESS_THRESHOLD', 0):
+            file_path = self.storage.save_dataset(self.dataset, test_data)
+            
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(4), b'\x28\xb5\x2f\xfd')
+        self.assertEqual(self.storage.load_dataset(self.dataset), test_data)
+        
+    def test_concurrent_saves_do_not_share_temp_file(self):
+        """测试并发保存同一数据集时各自写入独立的临时文件"""
+        payloads = [{"data": [{"price": i}] * 1000} for i in range(8)]
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            file_paths = list(executor.map(lambda data: self.storage.save_dataset(self.dataset, data), payloads))
+            
+        # 最终文件是某一次完整写入的内容，且没有残留的临时文件
+        self.assertIn(self.storage.load_dataset(self.dataset), payloads)
+        self.assertEqual(os.listdir(os.path.dirname(file_paths[0])), ['data.json'])
+        
     def test_delete_dataset(self):
         """测试数据集删除"""
         # 先保存数据
@@ -194,24 +300,20 @@ class DatasetStorageTests(TestCase):
 class IntegrationTests(TestCase):
     """集成测试"""
     
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 替换OpenAI客户端类，创建服务时不再构造真实的HTTP客户端
+        patcher = patch('dc_core.services.requirement_analysis.OpenAI')
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+    
     def setUp(self):
         self.requirement_service = RequirementAnalysisService()
         self.collector = EnhancedCollector()
         
-        # 创建OpenAI mock响应
-        mock_response = MagicMock()
-        mock_response.choices = [
-            MagicMock(
-                message=MagicMock(
-                    content=json.dumps({
-                        "data_type": "cryptocurrency",
-                        "timeframe": "last_week",
-                        "fields": ["price", "volume"]
-                    })
-                )
-            )
-        ]
-        self.requirement_service.openai_client.chat.completions.create = MagicMock(return_value=mock_response)
+        # 模拟OpenAI响应
+        self.requirement_service.openai_client.chat.completions.create = MagicMock(return_value=_CRYPTO_FIELDS_RESPONSE)
     
     def test_end_to_end_flow(self):
         """测试完整流程"""
@@ -234,22 +336,14 @@ class IntegrationTests(TestCase):
         })
         
         # 4. 模拟API响应
-        mock_response = MagicMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value={
+        stub_session = _StubSession({
             "data": [
                 {"price": 50000, "volume": 1000},
                 {"price": 51000, "volume": 1200}
             ]
         })
-        mock_response.raise_for_status = AsyncMock()
-        
-        # 创建mock会话
-        mock_session = MagicMock()
-        mock_session.get = AsyncMock(return_value=mock_response)
-        mock_session.close = AsyncMock()
         
-        with patch('aiohttp.ClientSession', return_value=mock_session):
+        with patch('aiohttp.ClientSession', return_value=stub_session):
             # 5. 创建数据集
             dataset = self.collector.create_collection_task(requirement, sync=True)
             
@@ -260,6 +354,14 @@ class IntegrationTests(TestCase):
 class DataQualityTests(TestCase):
     """数据质量测试"""
     
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = Dataset.objects.create(
+            name="test_dataset",
+            description="Test Dataset",
+            status="completed"
+        )
+        
     def setUp(self):
         self.quality_manager = DataQualityManager()
         
@@ -297,36 +399,24 @@ class DataQualityTests(TestCase):
     
     def test_quality_score(self):
         """测试质量评分"""
-        # 创建测试数据集
-        dataset = Dataset.objects.create(
-            name="test_dataset",
-            description="Test Dataset",
-            status="completed"
-        )
-        
         # 计算质量分数
-        score = self.quality_manager.calculate_quality_score(dataset)
+        score = self.quality_manager.calculate_quality_score(self.dataset)
         
         # 验证结果
         self.assertIsInstance(score, float)
         self.assertGreaterEqual(score, 0.0)
         self.assertLessEqual(score, 1.0)
 
-class AIEnhancerTests(TestCase):
-    """AI增强功能测试"""
+class AIEnhancerTestMixin:
+    """AI增强功能测试的公共准备工作"""
     
     def setUp(self):
         self.mock_openai = MagicMock()
-        mock_response = MagicMock()
-        mock_response.choices = [
-            MagicMock(
-                message=MagicMock(
-                    content='{"analysis": {"data_type": "user_behavior", "complexity": "medium"}}'
-                )
-            )
-        ]
-        self.mock_openai.chat.completions.create.return_value = mock_response
+        self.mock_openai.chat.completions.create.return_value = _ANALYSIS_RESPONSE
         self.ai_enhancer = AIEnhancer(openai_client=self.mock_openai)
+
+class AIEnhancerTests(AIEnhancerTestMixin, SimpleTestCase):
+    """AI增强功能测试（仅使用mock的OpenAI客户端，不访问数据库）"""
     
     def test_complex_requirement_analysis(self):
         requirement_text = "需要收集用户购买行为数据"
@@ -336,15 +426,7 @@ class AIEnhancerTests(TestCase):
         
     def test_data_source_suggestion(self):
         # 更新mock响应
-        mock_response = MagicMock()
-        mock_response.choices = [
-            MagicMock(
-                message=MagicMock(
-                    content='[{"name": "用户行为数据库", "type": "database", "url": "example.com"}]'
-                )
-            )
-        ]
-        self.mock_openai.chat.completions.create.return_value = mock_response
+        self.mock_openai.chat.completions.create.return_value = _DATA_SOURCES_RESPONSE
         
         requirement = {
             'data_type': '用户行为',
@@ -353,18 +435,22 @@ class AIEnhancerTests(TestCase):
         suggestions = self.ai_enhancer.suggest_data_sources(requirement)
         self.assertIsInstance(suggestions, list)
         self.assertTrue(len(suggestions) > 0)
+
+class AIEnhancerDatasetTests(AIEnhancerTestMixin, TestCase):
+    """AI增强功能的数据集分析测试"""
     
-    def test_anomaly_detection(self):
-        """测试异常检测"""
-        # 创建测试数据集
-        dataset = Dataset.objects.create(
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = Dataset.objects.create(
             name="test_dataset",
             description="Test Dataset",
             status="completed"
         )
-        
+    
+    def test_anomaly_detection(self):
+        """测试异常检测"""
         # 检测异常
-        result = self.ai_enhancer.detect_anomalies(dataset)
+        result = self.ai_enhancer.detect_anomalies(self.dataset)
         
         # 验证结果
         self.assertIn('anomaly_count', result)
@@ -373,62 +459,53 @@ class AIEnhancerTests(TestCase):
     
     def test_feature_extraction(self):
         """测试特征提取"""
-        # 创建测试数据集
-        dataset = Dataset.objects.create(
-            name="test_dataset",
-            description="Test Dataset",
-            status="completed"
-        )
-        
         # 提取特征
-        features = self.ai_enhancer.extract_features(dataset)
+        features = self.ai_enhancer.extract_features(self.dataset)
         
         # 验证结果
         self.assertIn('basic_stats', features)
         self.assertIn('correlations', features)
         self.assertIn('distributions', features)
 
-class EnhancedCollectorTests(TestCase):
+class EnhancedCollectorTests(SimpleTestCase):
     """增强型数据采集器测试"""
     
-    def setUp(self):
-        """测试前准备工作"""
-        super().setUp()
-        self.collector = EnhancedCollector()
-        
-        # 创建测试数据库
-        self.db_path = ':memory:'
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
-        
-        # 创建测试表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS test_table (
+    @classmethod
+    def setUpClass(cls):
+        """创建测试数据库，表结构和测试数据在整个测试类中只创建一次"""
+        super().setUpClass()
+        cls.db_path = ':memory:'
+        # 自动提交模式，由各测试的保存点自行控制事务
+        cls.conn = sqlite3.connect(cls.db_path, isolation_level=None)
+        cls.conn.execute('''
+            CREATE TABLE test_table (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
                 value INTEGER NOT NULL
             )
         ''')
-        
-        # 插入测试数据
-        self.cursor.executemany(
+        cls.conn.executemany(
             'INSERT INTO test_table (name, value) VALUES (?, ?)',
             [('test1', 100), ('test2', 200)]
         )
-        self.conn.commit()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        super().tearDownClass()
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.collector = EnhancedCollector()
         
-        # 设置测试数据库连接
+        # 设置测试数据库连接，测试中的修改在保存点回滚后撤销
         self.collector._test_conn = self.conn
+        self.conn.execute('SAVEPOINT test_case')
     
     def tearDown(self):
         """测试后清理工作"""
-        if hasattr(self, 'cursor') and self.cursor:
-            self.cursor.execute('DROP TABLE IF EXISTS test_table')
-            self.conn.commit()
-            self.cursor.close()
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
-        super().tearDown()
+        self.conn.execute('ROLLBACK TO SAVEPOINT test_case')
+        self.conn.execute('RELEASE SAVEPOINT test_case')
     
     def test_database_collection(self):
         """测试数据库数据采集"""
@@ -32,13 +32,13 @@ class TestFirestoreManager(TestCase):
             update_data = {'age': 26}
             await firestore_manager.update_document(collection_name, doc_id, update_data)
             
-            # 验证更新
-            updated_doc = await firestore_manager.get_document(collection_name, doc_id)
-            assert updated_doc['age'] == 26, "文档更新失败"
-            
-            # 查询文档
+            # 验证更新并查询文档，两次读取互不依赖，并发执行
             filters = [('name', '==', '测试用户')]
-            docs = await firestore_manager.query_documents(collection_name, filters=filters)
+            updated_doc, docs = await asyncio.gather(
+                firestore_manager.get_document(collection_name, doc_id),
+                firestore_manager.query_documents(collection_name, filters=filters)
+            )
+            assert updated_doc['age'] == 26, "文档更新失败"
             assert len(docs) > 0, "文档查询失败"
             
             # 删除文档
@@ -2,30 +2,73 @@
 市场数据服务测试
 """
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
 from dc_core.services.market_data import MarketDataService, DataSourceError
-from dc_core.services.sentiment_analysis import MarketSentimentService
+from dc_core.services.sentiment_analysis import MarketSentimentService, _OrjsonClient, _technical_indicator_kernel
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from binance.exceptions import BinanceAPIException
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from django.core.cache import caches
 
-@pytest.fixture
+# 模拟K线数据（24小时），各测试只读使用，模块加载时构造一次
+KLINES_24H = [[
+    1234567890000,  # timestamp
+    "50000.00",     # open
+    "51000.00",     # high
+    "49000.00",     # low
+    "50500.00",     # close
+    "100.00",       # volume
+    1234567890000,  # close_time
+    "5000000.00",   # quote_volume
+    100,            # trades
+    "50.00",        # taker_base
+    "2500000.00",   # taker_quote
+    "0"             # ignore
+]] * 24
+
+# 模拟大额交易数据
+WHALE_TRADES = [
+    {'quoteQty': "100000.00", 'price': "50000.00", 'qty': "2.00"}
+] * 100
+
+# 模拟Yahoo Finance的日线历史数据，测试中只读使用
+AAPL_HIST = pd.DataFrame({
+    'Open': [150.0],
+    'High': [155.0],
+    'Low': [148.0],
+    'Close': [152.0],
+    'Volume': [1000000]
+}, index=[pd.Timestamp('2024-02-10')])
+
+def _raise_invalid_symbol(*args, **kwargs):
+    """模拟Yahoo Finance对无效股票代码抛出异常"""
+    raise Exception("Invalid symbol")
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """清空缓存，避免Binance接口结果在测试之间复用"""
+    caches['binance'].clear()
+
+@pytest.fixture(scope='module')
 def service():
-    """创建市场数据服务实例"""
-    return MarketDataService()
+    """创建市场数据服务实例，服务本身无可变状态，整个模块共用一个实例
+    
+    Binance客户端替换为mock，创建时不连接Binance，各测试再按需patch其接口方法
+    """
+    with patch('dc_core.services.market_data.Client'):
+        return MarketDataService()
+
+@pytest.fixture(scope='module')
+def sentiment_service():
+    """创建市场情绪服务实例，整个模块共用，Binance客户端同样替换为mock"""
+    with patch('dc_core.services.sentiment_analysis._get_binance_client', return_value=MagicMock()):
+        return MarketSentimentService()
 
 def test_get_stock_data_success(service):
     """测试成功获取股票数据"""
-    mock_hist = pd.DataFrame({
-        'Open': [150.0],
-        'High': [155.0],
-        'Low': [148.0],
-        'Close': [152.0],
-        'Volume': [1000000]
-    }, index=[pd.Timestamp('2024-02-10')])
-    
-    mock_ticker = MagicMock()
-    mock_ticker.history.return_value = mock_hist
+    mock_ticker = SimpleNamespace(history=lambda *args, **kwargs: AAPL_HIST)
     
     with patch.object(service, 'yf_client', return_value=mock_ticker):
         data = service.get_stock_data('AAPL')
@@ -42,8 +85,7 @@ def test_get_stock_data_success(service):
 
 def test_get_stock_data_invalid_symbol(service):
     """测试获取无效股票代码数据"""
-    mock_ticker = MagicMock()
-    mock_ticker.history.side_effect = Exception("Invalid symbol")
+    mock_ticker = SimpleNamespace(history=_raise_invalid_symbol)
     
     with patch.object(service, 'yf_client', return_value=mock_ticker):
         with pytest.raises(DataSourceError):
@@ -76,9 +118,10 @@ def test_get_crypto_data_success(service):
         'asks': [["50100.00", "1.00"], ["50200.00", "2.00"]]
     }
     
-    with patch.object(service.binance, 'get_klines', return_value=mock_klines), \
-         patch.object(service.binance, 'get_ticker', return_value=mock_ticker), \
-         patch.object(service.binance, 'get_order_book', return_value=mock_depth):
+    with patch.multiple(service.binance,
+                        get_klines=MagicMock(return_value=mock_klines),
+                        get_ticker=MagicMock(return_value=mock_ticker),
+                        get_order_book=MagicMock(return_value=mock_depth)):
         
         data = service.get_crypto_data('BTCUSDT')
         
@@ -95,9 +138,7 @@ def test_get_crypto_data_success(service):
 
 def test_get_crypto_data_invalid_symbol(service):
     """测试获取无效交易对数据"""
-    mock_response = Mock()
-    mock_response.text = '{"code": -1121, "msg": "Invalid symbol"}'
-    mock_response.status_code = 400
+    mock_response = SimpleNamespace(text='{"code": -1121, "msg": "Invalid symbol"}', status_code=400)
     
     with patch.object(service.binance, 'get_klines', side_effect=BinanceAPIException(
         response=mock_response,
@@ -115,9 +156,10 @@ def test_binance_market_depth(service):
         'asks': [["50100.00", "1.00"], ["50200.00", "2.00"]]
     }
     
-    with patch.object(service.binance, 'get_klines', return_value=[[1234567890000, "50000.00", "51000.00", "49000.00", "50500.00", "100.00"]]), \
-         patch.object(service.binance, 'get_ticker', return_value={'lastPrice': "50500.00", 'priceChange': "500.00", 'priceChangePercent': "1.00"}), \
-         patch.object(service.binance, 'get_order_book', return_value=mock_depth):
+    with patch.multiple(service.binance,
+                        get_klines=MagicMock(return_value=[[1234567890000, "50000.00", "51000.00", "49000.00", "50500.00", "100.00"]]),
+                        get_ticker=MagicMock(return_value={'lastPrice': "50500.00", 'priceChange': "500.00", 'priceChangePercent': "1.00"}),
+                        get_order_book=MagicMock(return_value=mock_depth)):
         
         data = service.get_crypto_data('BTCUSDT')
         assert len(data['data']['market_depth']['bids']) == 2
@@ -126,9 +168,7 @@ def test_binance_market_depth(service):
 
 def test_binance_error_handling(service):
     """测试Binance错误处理"""
-    mock_response = Mock()
-    mock_response.text = '{"code": -1000, "msg": "Internal Server Error"}'
-    mock_response.status_code = 500
+    mock_response = SimpleNamespace(text='{"code": -1000, "msg": "Internal Server Error"}', status_code=500)
     
     with patch.object(service.binance, 'get_klines', side_effect=BinanceAPIException(
         response=mock_response,
@@ -139,24 +179,8 @@ def test_binance_error_handling(service):
             service.get_crypto_data('BTCUSDT')
         assert "Binance API错误" in str(exc_info.value)
 
-def test_get_crypto_sentiment_success(service):
+def test_get_crypto_sentiment_success(sentiment_service):
     """测试成功获取加密货币市场情绪数据"""
-    # 模拟K线数据
-    mock_klines = [[
-        1234567890000,  # timestamp
-        "50000.00",     # open
-        "51000.00",     # high
-        "49000.00",     # low
-        "50500.00",     # close
-        "100.00",       # volume
-        1234567890000,  # close_time
-        "5000000.00",   # quote_volume
-        100,            # trades
-        "50.00",        # taker_base
-        "2500000.00",   # taker_quote
-        "0"             # ignore
-    ]] * 24  # 24小时数据
-    
     # 模拟市场深度数据
     mock_depth = {
         'bids': [["50000.00", "1.00"], ["49900.00", "2.00"]] * 10,
@@ -172,17 +196,11 @@ def test_get_crypto_sentiment_success(service):
         'weightedAvgPrice': "50000.00"
     }
     
-    # 模拟大额交易数据
-    mock_trades = [
-        {'quoteQty': "100000.00", 'price': "50000.00", 'qty': "2.00"}
-    ] * 100
-    
-    sentiment_service = MarketSentimentService()
-    
-    with patch.object(sentiment_service.binance, 'get_klines', return_value=mock_klines), \
-         patch.object(sentiment_service.binance, 'get_order_book', return_value=mock_depth), \
-         patch.object(sentiment_service.binance, 'get_ticker', return_value=mock_ticker), \
-         patch.object(sentiment_service.binance, 'get_recent_trades', return_value=mock_trades):
+    with patch.multiple(sentiment_service.binance,
+                        get_klines=MagicMock(return_value=KLINES_24H),
+                        get_order_book=MagicMock(return_value=mock_depth),
+                        get_ticker=MagicMock(return_value=mock_ticker),
+                        get_recent_trades=MagicMock(return_value=WHALE_TRADES)):
         
         data = sentiment_service.get_crypto_sentiment('BTCUSDT')
         
@@ -208,6 +226,8 @@ def test_get_crypto_sentiment_success(service):
         assert 'sell_pressure' in depth
         assert 'pressure_ratio' in depth
         assert 'spread' in depth
+        assert len(depth['volume_share']['bids']) == 20
+        assert sum(depth['volume_share']['bids']) + sum(depth['volume_share']['asks']) == pytest.approx(1.0)
         
         # 验证交易量分析
         volume = data['data']['volume_analysis']
@@ -222,54 +242,101 @@ def test_get_crypto_sentiment_success(service):
         assert 'total_whale_volume' in whale
         assert 'avg_whale_trade_size' in whale
 
-def test_get_crypto_sentiment_error(service):
-    """测试获取市场情绪数据时的错误处理"""
-    mock_response = Mock()
-    mock_response.text = '{"code": -1121, "msg": "Invalid symbol"}'
-    mock_response.status_code = 400
+def test_get_crypto_sentiment_error(sentiment_service):
+    """测试获取市场情绪数据时的错误处理：K线接口报错时技术指标为空，其余分析照常返回"""
+    mock_response = SimpleNamespace(text='{"code": -1121, "msg": "Invalid symbol"}', status_code=400)
     
-    sentiment_service = MarketSentimentService()
+    with patch.multiple(sentiment_service.binance,
+                        get_klines=MagicMock(side_effect=BinanceAPIException(
+                            response=mock_response,
+                            status_code=400,
+                            text='{"code": -1121, "msg": "Invalid symbol"}'
+                        )),
+                        get_order_book=MagicMock(return_value={'bids': [], 'asks': []}),
+                        get_ticker=MagicMock(return_value={}),
+                        get_recent_trades=MagicMock(return_value=[])):
+        
+        data = sentiment_service.get_crypto_sentiment('INVALID_PAIR')
+        
+        assert data['status'] == 'success'
+        assert data['data']['technical_analysis'] == {}
+
+def test_get_crypto_sentiment_cached(sentiment_service):
+    """测试有效期内重复查询复用Binance接口结果"""
+    mock_get_klines = MagicMock(return_value=KLINES_24H)
+    mock_get_order_book = MagicMock(return_value={'bids': [], 'asks': []})
     
-    with patch.object(sentiment_service.binance, 'get_klines', 
-                     side_effect=BinanceAPIException(
-                         response=mock_response,
-                         status_code=400,
-                         text='{"code": -1121, "msg": "Invalid symbol"}'
-                     )):
-        with pytest.raises(BinanceAPIException):
-            sentiment_service.get_crypto_sentiment('INVALID_PAIR')
+    with patch.multiple(sentiment_service.binance,
+                        get_klines=mock_get_klines,
+                        get_order_book=mock_get_order_book,
+                        get_ticker=MagicMock(return_value={}),
+                        get_recent_trades=MagicMock(return_value=[])):
+        
+        sentiment_service.get_crypto_sentiment('BTCUSDT')
+        sentiment_service.get_crypto_sentiment('BTCUSDT')
+        sentiment_service.get_crypto_sentiment('ETHUSDT')
+        
+        assert mock_get_klines.call_count == 2
+        assert mock_get_order_book.call_count == 2
 
-def test_sentiment_calculation(service):
-    """测试市场情绪计算逻辑"""
-    sentiment_service = MarketSentimentService()
+@pytest.mark.parametrize('length', [10, 14, 20, 24, 60])
+def test_technical_indicator_kernel_matches_pandas(length):
+    """测试技术指标内核与pandas的rolling/ewm计算结果一致"""
+    close = 50000 + np.cumsum(np.random.default_rng(length).normal(0, 100, length))
+    series = pd.Series(close)
     
-    # 测试不同情况下的情绪计算
-    test_cases = [
-        # 极度看多情况
-        {
-            'technical': {'rsi': 75, 'macd': {'histogram': 1.5}},
-            'depth': {'pressure_ratio': 1.5},
-            'volume': {'volume_score': 0.8, 'price_change_percent': 6},
-            'whale': {'whale_activity_score': 0.7, 'whale_trades_count': 15}
-        },
-        # 看空情况
-        {
-            'technical': {'rsi': 25, 'macd': {'histogram': -1.5}},
-            'depth': {'pressure_ratio': 0.7},
-            'volume': {'volume_score': 0.3, 'price_change_percent': -6},
-            'whale': {'whale_activity_score': 0.3, 'whale_trades_count': 5}
-        }
+    delta = series.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    macd = series.ewm(span=12, adjust=False).mean() - series.ewm(span=26, adjust=False).mean()
+    sma = series.rolling(window=20).mean()
+    std = series.rolling(window=20).std()
+    expected = [
+        (100 - 100 / (1 + gain / loss)).iloc[-1],
+        macd.iloc[-1],
+        macd.ewm(span=9, adjust=False).mean().iloc[-1],
+        (sma + std * 2).iloc[-1],
+        sma.iloc[-1],
+        (sma - std * 2).iloc[-1]
     ]
     
-    for case in test_cases:
-        result = sentiment_service._calculate_overall_sentiment(
-            case['technical'],
-            case['depth'],
-            case['volume'],
-            case['whale']
-        )
-        
-        assert 'score' in result
-        assert 'label' in result
-        assert 'details' in result
-        assert 0 <= result['score'] <= 1 
\ No newline at end of file
+    np.testing.assert_allclose(_technical_indicator_kernel(close), expected, rtol=1e-9)
+
+def test_orjson_client_handle_response():
+    """测试orjson解析Binance响应体"""
+    response = SimpleNamespace(status_code=200, content=b'[{"price": "50000.00", "quoteQty": "5000.00"}]')
+    assert _OrjsonClient._handle_response(response) == [{'price': '50000.00', 'quoteQty': '5000.00'}]
+    
+    response = SimpleNamespace(status_code=200, content=b'')
+    assert _OrjsonClient._handle_response(response) == {}
+    
+    response = SimpleNamespace(status_code=200, content=b'<html>', text='<html>')
+    with pytest.raises(BinanceRequestException):
+        _OrjsonClient._handle_response(response)
+
+@pytest.mark.parametrize('technical,depth,volume,whale', [
+    # 极度看多情况
+    pytest.param(
+        {'rsi': 75, 'macd': {'histogram': 1.5}},
+        {'pressure_ratio': 1.5},
+        {'volume_score': 0.8, 'price_change_percent': 6},
+        {'whale_activity_score': 0.7, 'whale_trades_count': 15},
+        id='bullish'
+    ),
+    # 看空情况
+    pytest.param(
+        {'rsi': 25, 'macd': {'histogram': -1.5}},
+        {'pressure_ratio': 0.7},
+        {'volume_score': 0.3, 'price_change_percent': -6},
+        {'whale_activity_score': 0.3, 'whale_trades_count': 5},
+        id='bearish'
+    )
+])
+def test_sentiment_calculation(sentiment_service, technical, depth, volume, whale):
+    """测试市场情绪计算逻辑"""
+    result = sentiment_service._calculate_overall_sentiment(technical, depth, volume, whale)
+    
+    assert 'score' in result
+    assert 'label' in result
+    assert 'details' in result
+    assert 0 <= result['score'] <= 1 
\ No newline at end of file
@@ -1,50 +1,70 @@
 import asyncio
 import logging
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.test import SimpleTestCase
 from dc_core.services.social_sentiment import SocialSentimentService
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def log_sentiment(symbol: str, sentiment: dict):
+    """输出单个币种的情绪分析结果"""
+    if sentiment['status'] != 'success':
+        return
+    
+    data = sentiment['data']
+    logger.info(f"{symbol}综合情绪: 分数={data['overall']['score']:.2f}, "
+               f"标签={data['overall']['label']}, "
+               f"置信度={data['overall']['confidence']:.2f}")
+    
+    # 输出Twitter详细数据
+    if data['twitter']:
+        metrics = data['twitter']['metrics']
+        logger.info("\nTwitter数据:")
+        logger.info(f"情绪计数: {metrics['sentiment_counts']}")
+        logger.info(f"情绪比例: {metrics['sentiment_ratio']}")
+    else:
+        logger.warning("Twitter数据获取失败")
+
+class TweetSentimentTests(SimpleTestCase):
+    """推文情绪关键词匹配测试"""
+    
+    def setUp(self):
+        with patch.object(SocialSentimentService, '_init_twitter_client', return_value=None):
+            self.service = SocialSentimentService()
+            
+    def analyze(self, *texts):
+        return self.service._analyze_tweets([SimpleNamespace(text=text) for text in texts])['sentiment_counts']
+        
+    def test_keywords_match_as_substrings(self):
+        """关键词按子串匹配，与web_scrapers的关键词扫描一致"""
+        # 'bullish'同时命中'bullish'和'bull'，多于'crash'一个关键词
+        self.assertEqual(self.analyze("Bullish crash")['bullish'], 1)
+        # 'support'中包含'up'
+        self.assertEqual(self.analyze("strong support")['bullish'], 1)
+        # 'breakdown'同时命中'breakdown'和'down'，多于只命中'rising'的看涨关键词
+        self.assertEqual(self.analyze("breakdown after rising")['bearish'], 1)
+        
+    def test_each_keyword_counts_once_per_tweet(self):
+        """同一关键词在一条推文中重复出现只计一次"""
+        self.assertEqual(self.analyze("dump dump dump buy moon"), {'bullish': 1, 'bearish': 0, 'neutral': 0})
+        self.assertEqual(self.analyze("nothing here"), {'bullish': 0, 'bearish': 0, 'neutral': 1})
+
 async def main():
     """测试Twitter情绪分析"""
     service = SocialSentimentService()
+    symbols = ['BTC', 'TRUMP']
     
     try:
-        # 获取比特币情绪数据
-        logger.info("获取BTC情绪数据...")
-        btc_sentiment = await service.get_social_sentiment('BTC')
-        if btc_sentiment['status'] == 'success':
-            data = btc_sentiment['data']
-            logger.info(f"BTC综合情绪: 分数={data['overall']['score']:.2f}, "
-                       f"标签={data['overall']['label']}, "
-                       f"置信度={data['overall']['confidence']:.2f}")
-            
-            # 输出Twitter详细数据
-            if data['twitter']:
-                metrics = data['twitter']['metrics']
-                logger.info("\nTwitter数据:")
-                logger.info(f"情绪计数: {metrics['sentiment_counts']}")
-                logger.info(f"情绪比例: {metrics['sentiment_ratio']}")
-            else:
-                logger.warning("Twitter数据获取失败")
+        # 并发获取比特币和Trump Coin情绪数据，服务内部按速率限制串行化Twitter请求
+        logger.info(f"获取{'、'.join(symbols)}情绪数据...")
+        sentiments = await asyncio.gather(
+            *(service.get_social_sentiment(symbol) for symbol in symbols)
+        )
         
-        # 获取Trump Coin情绪数据
-        logger.info("\n获取TRUMP情绪数据...")
-        trump_sentiment = await service.get_social_sentiment('TRUMP')
-        if trump_sentiment['status'] == 'success':
-            data = trump_sentiment['data']
-            logger.info(f"TRUMP综合情绪: 分数={data['overall']['score']:.2f}, "
-                       f"标签={data['overall']['label']}, "
-                       f"置信度={data['overall']['confidence']:.2f}")
-            
-            # 输出Twitter详细数据
-            if data['twitter']:
-                metrics = data['twitter']['metrics']
-                logger.info("\nTwitter数据:")
-                logger.info(f"情绪计数: {metrics['sentiment_counts']}")
-                logger.info(f"情绪比例: {metrics['sentiment_ratio']}")
-            else:
-                logger.warning("Twitter数据获取失败")
+        for symbol, sentiment in zip(symbols, sentiments):
+            log_sentiment(symbol, sentiment)
                     
     except Exception as e:
         logger.error(f"测试过程中发生错误: {e}")
@@ -4,12 +4,15 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
-from dc_core.models import Dataset, Project
+from django.core.cache import caches
+from dc_core.models import Dataset, Project, AgentPerformance, DataQualityMetric
 from dc_validation.services import DataQualityService
 from dc_core.services.data_processing import DataProcessor
+from dc_collector.services.data_source_manager import DataSourceManager
 import json
+from time import perf_counter_ns
+from unittest.mock import patch
 import pandas as pd
-import numpy as np
 
 User = get_user_model()
 
@@ -17,35 +20,41 @@ User = get_user_model()
 class SystemTest(TestCase):
     """系统集成测试"""
     
-    def setUp(self):
-        """测试准备工作"""
+    @classmethod
+    def setUpTestData(cls):
+        """创建测试数据，整个测试类只创建一次，各测试结束后由事务回滚撤销修改"""
         # 创建测试用户
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             username='testuser',
             password='testpass123',
             email='test@example.com'
         )
         
-        # 创建测试客户端
-        self.client = APIClient()
-        self.client.force_authenticate(user=self.user)
-        
         # 创建测试项目
-        self.project = Project.objects.create(
+        cls.project = Project.objects.create(
             name='测试项目',
             description='用于系统测试的项目',
             objective='测试系统功能',
-            owner=self.user
+            owner=cls.user
         )
         
         # 创建测试数据集
-        self.dataset = Dataset.objects.create(
+        cls.dataset = Dataset.objects.create(
             name='测试数据集',
             description='用于测试的数据集',
-            project=self.project,
+            project=cls.project,
             format='csv',
             size=1000
         )
+    
+    def setUp(self):
+        """测试准备工作"""
+        # 测试数据在各测试间共用，清空缓存避免上一个测试的质量评分被复用
+        caches['quality'].clear()
+        
+        # 创建测试客户端
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
         
         # 初始化服务
         self.quality_service = DataQualityService()
@@ -84,13 +93,6 @@ class SystemTest(TestCase):
         """测试数据处理功能"""
         print("\n测试数据处理功能...")
         
-        # 创建测试数据
-        test_data = pd.DataFrame({
-            'A': np.random.randn(100),
-            'B': np.random.randn(100),
-            'C': np.random.choice(['X', 'Y', 'Z'], 100)
-        })
-        
         # 测试数据预览
         preview = self.data_processor.get_preview(rows=5)
         self.assertIsNotNone(preview)
@@ -131,6 +133,60 @@ class SystemTest(TestCase):
         self.assertTrue(validation_result['is_valid'])
         print("数据模式验证功能测试通过")
     
+    def test_quality_evaluation_cached(self):
+        """测试数据集未更新时复用缓存的质量评估结果"""
+        print("\n测试质量评估缓存...")
+        
+        data = pd.DataFrame({'A': [1.5, 2.5, 3.25], 'C': ['X', 'Y', 'Z']})
+        with patch.object(self.quality_service, '_load_dataset_data', return_value=data) as mock_load:
+            first_score = self.quality_service.evaluate_dataset(self.dataset)
+            second_score = self.quality_service.evaluate_dataset(self.dataset)
+            self.assertEqual(first_score, second_score)
+            self.assertEqual(mock_load.call_count, 1)
+            
+            # 数据集更新后重新评估
+            self.dataset.save()
+            self.quality_service.evaluate_dataset(self.dataset)
+            self.assertEqual(mock_load.call_count, 2)
+        print("质量评估缓存功能测试通过")
+    
+    def test_batch_quality_evaluation(self):
+        """测试批量评估数据集质量"""
+        print("\n测试批量质量评估...")
+        
+        other_dataset = Dataset.objects.create(
+            name='测试数据集2',
+            description='用于批量评估测试的数据集',
+            project=self.project,
+            format='csv',
+            size=1000
+        )
+        datasets = [self.dataset, other_dataset]
+        
+        data = pd.DataFrame({'A': [1.5, 2.5, 3.25], 'C': ['X', 'Y', 'Z']})
+        with patch.object(self.quality_service, '_load_dataset_data', return_value=data):
+            scores = self.quality_service.evaluate_datasets(datasets)
+            self.assertEqual(len(scores), 2)
+            self.assertTrue(all(score > 0 for score in scores))
+            self.assertEqual(DataQualityMetric.objects.filter(dataset__in=datasets).count(), 2)
+            
+            # 质量分数已缓存时，所有记录通过一次查询写入
+            with self.assertNumQueries(1):
+                self.quality_service.evaluate_datasets(datasets)
+        print("批量质量评估功能测试通过")
+    
+    def test_relevance_evaluation(self):
+        """测试数据相关性评分"""
+        print("\n测试数据相关性评分...")
+        
+        # 没有性能记录时返回中等分数
+        self.assertEqual(self.quality_service._evaluate_relevance(self.dataset), 50.0)
+        
+        AgentPerformance.objects.create(project=self.project, dataset=self.dataset, metrics={'accuracy': 0.8, 'recall': 0.6})
+        AgentPerformance.objects.create(project=self.project, dataset=self.dataset, metrics={'accuracy': 0.4})
+        self.assertAlmostEqual(self.quality_service._evaluate_relevance(self.dataset), 55.0)
+        print("数据相关性评分功能测试通过")
+    
     def test_error_handling(self):
         """测试错误处理"""
         print("\n测试错误处理...")
@@ -149,29 +205,39 @@ class SystemTest(TestCase):
         print("未认证访问处理测试通过")
     
     def test_performance(self):
-        """测试性能"""
-        print("\n测试性能...")
+        """测试性能
         
-        import time
+        行情数据源替换为固定结果，测量的是API自身的处理开销而不是外部数据源的网络延迟
+        """
+        print("\n测试性能...")
         
-        # 测试 API 响应时间
-        start_time = time.time()
-        response = self.client.get('/api/financial/market_data/', {
+        market_data = {'data': {'current_price': 152.0, 'source': 'yahoo'}, 'status': 'success'}
+        params = {
             'symbol': 'AAPL',
             'interval': '1d'
-        })
-        end_time = time.time()
+        }
+        
+        with patch.object(DataSourceManager, 'get_market_data', return_value=market_data) as mock_get:
+            # 预热一次，排除首次请求的模块导入和初始化开销
+            self.client.get('/api/financial/market_data/', params)
+            
+            # 测试 API 响应时间，行情数据来自外部数据源，请求过程不应访问数据库
+            start_time = perf_counter_ns()
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/financial/market_data/', params)
+            response_time = (perf_counter_ns() - start_time) / 1e9
         
-        response_time = end_time - start_time
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, market_data)
+        mock_get.assert_called_with('AAPL', '1d', 'yahoo')
         self.assertLess(response_time, 5.0)  # 响应时间应小于5秒
         print(f"API 响应时间: {response_time:.2f}秒")
         
         # 测试数据处理性能
-        start_time = time.time()
+        start_time = perf_counter_ns()
         self.data_processor.get_statistics()
-        end_time = time.time()
+        processing_time = (perf_counter_ns() - start_time) / 1e9
         
-        processing_time = end_time - start_time
         self.assertLess(processing_time, 3.0)  # 处理时间应小于3秒
         print(f"数据处理时间: {processing_time:.2f}秒")
     
@@ -206,12 +272,6 @@ class SystemTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('technicals', response.data)
         print("OpenBB技术指标测试通过")
-    
-    def tearDown(self):
-        """清理测试数据"""
-        self.user.delete()
-        self.project.delete()
-        self.dataset.delete()
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
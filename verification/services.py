@@ -1,23 +1,157 @@
-from typing import Dict, Any
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Tuple
 import numpy as np
 from core.models import Dataset
 from crypto.zkp import ZKPProtocol
 from crypto.gkr import GKRProtocol
 import pandas as pd
+from django.conf import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = pa_csv = None
+
+logger = logging.getLogger(__name__)
+
+GKR_CIRCUIT_DEPTH = 3
+CSV_CHUNK_ROWS = 100000  # 生成数据集描述时分块读取，内存占用与文件大小无关
+
+def _load_array(path: str) -> np.ndarray:
+    """读取数据集的数值数组
+    
+    首次读取CSV后在缓存目录保存.npy副本，之后CSV未更新时以内存映射方式加载副本，
+    跳过CSV解析且只读入实际访问的页。副本文件名包含CSV路径的摘要及文件大小和纳秒级修改时间，
+    三者完全一致时才复用，CSV被替换后（包括修改时间更早的文件）不会读到旧副本。
+    缓存目录仅限当前用户访问，目录权限不满足要求时不读写副本
+    """
+    stat = os.stat(path)
+    cache_dir = getattr(settings, 'VERIFICATION_CACHE_DIR', None)
+    if not cache_dir or not _private_cache_dir(cache_dir):
+        return _parse_csv_array(path)
+    
+    path_digest = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()
+    binary_path = os.path.join(cache_dir, f"{path_digest}-{stat.st_size}-{stat.st_mtime_ns}.npy")
+    try:
+        return np.load(binary_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass  # 副本不存在或损坏时重新解析CSV
+    
+    data = _parse_csv_array(path)
+    
+    # 先写各自独立的临时文件再原子替换，多个线程或进程同时验证同一数据集时不会读到写了一半的副本
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_path, binary_path)
+        tmp_path = None
+        
+        # 删除该CSV旧版本留下的副本
+        for name in os.listdir(cache_dir):
+            if name.startswith(path_digest + '-') and name.endswith('.npy') and name != os.path.basename(binary_path):
+                os.remove(os.path.join(cache_dir, name))
+    except OSError as e:
+        logger.warning(f"保存数据集数组副本失败: {str(e)}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return data
+
+def _private_cache_dir(cache_dir: str) -> bool:
+    """以0700权限创建缓存目录，并确认目录属于当前用户且其他用户不可写
+    
+    共享目录中其他用户可以预先放置副本，此时不能信任其中的文件
+    """
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        stat = os.stat(cache_dir)
+    except OSError as e:
+        logger.warning(f"无法创建数据集数组缓存目录: {str(e)}")
+        return False
+    if hasattr(os, 'getuid') and (stat.st_uid != os.getuid() or stat.st_mode & 0o077):
+        logger.warning(f"数据集数组缓存目录不是当前用户的私有目录，跳过缓存: {cache_dir}")
+        return False
+    return True
+
+def _parse_csv_array(path: str) -> np.ndarray:
+    """读取数据集为二维float64数组
+    
+    非数值列无法参与电路计算，存在时抛出ValueError并列出这些列，不只验证其余的数值列。
+    pyarrow可用时使用其多线程解析器，各列直接写入预先分配的连续数组，不经过DataFrame
+    """
+    if pa_csv is None:
+        df = pd.read_csv(path)
+        _check_numeric_columns(path, df.columns.difference(df.select_dtypes('number').columns, sort=False))
+        return df.to_numpy(dtype=np.float64)
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=1 << 20)
+    table = pa_csv.read_csv(path, read_options=read_options)
+    _check_numeric_columns(path, [
+        field.name for field in table.schema
+        if not (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+    ])
+    
+    data = np.empty((table.num_rows, table.num_columns), dtype=np.float64)
+    for i, column in enumerate(table.columns):
+        data[:, i] = column.to_numpy()
+    return data
+
+def _check_numeric_columns(path: str, non_numeric: Iterable[str]) -> None:
+    """数据集包含非数值列时抛出ValueError"""
+    non_numeric = list(non_numeric)
+    if non_numeric:
+        raise ValueError(f"数据集包含无法参与GKR验证的非数值列 {non_numeric}: {path}")
+
+@lru_cache(maxsize=128)
+def _dataset_summary(path: str, mtime: float, size: int) -> Tuple[int, pd.Series]:
+    """统计数据集的行数和列类型，文件修改时间或大小变化后缓存键随之改变
+    
+    逐块读取CSV并累计行数，各块的列类型按pandas的合并规则统一，不同块类型不一致的列归为object
+    """
+    rows = 0
+    heads = []
+    for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_ROWS):
+        rows += len(chunk)
+        heads.append(chunk.iloc[:0])
+    return rows, pd.concat(heads).dtypes
+
+@lru_cache(maxsize=4)
+def _gkr(circuit_depth: int) -> GKRProtocol:
+    """按电路深度共享GKR协议实例，协议对象只保存电路深度和验证密钥，不随单次证明变化"""
+    return GKRProtocol(circuit_depth=circuit_depth)
+
+@lru_cache(maxsize=128)
+def _verify_gkr(path: str, mtime: float, size: int, circuit_depth: int) -> bool:
+    """对数据集执行GKR证明和验证，结果只取决于文件内容和电路深度，按文件缓存"""
+    data = _load_array(path)
+    gkr_protocol = _gkr(circuit_depth)
+    proof = gkr_protocol.prove_computation(data)
+    return gkr_protocol.verify_computation(proof, data)
+
+@lru_cache(maxsize=4)
+def _zkp(secret: bytes) -> ZKPProtocol:
+    """按密钥共享ZKP协议实例，协议对象只保存密钥和生成元，不随单次证明变化"""
+    return ZKPProtocol(secret=secret)
 
 class VerificationService:
+    __slots__ = ('dataset', 'zkp_protocol', 'gkr_protocol')  # 批量验证时按数据集大量创建实例
+    
     def __init__(self, dataset: Dataset):
         self.dataset = dataset
-        self.zkp_protocol = ZKPProtocol(secret=b'your-secret-key')
-        self.gkr_protocol = GKRProtocol()
+        self.zkp_protocol = _zkp(getattr(settings, 'ZKP_SECRET', 'your-secret-key').encode())
+        self.gkr_protocol = _gkr(GKR_CIRCUIT_DEPTH)
         
     def generate_zkp_proof(self) -> Dict[str, Any]:
         """生成零知识证明"""
-        # 读取数据集
-        df = pd.read_csv(self.dataset.file_path)
-        
         # 生成数据集特征描述
-        statement = self._generate_dataset_statement(df)
+        statement = self._generate_dataset_statement()
         
         # 生成证明
         proof = self.zkp_protocol.generate_proof(statement)
@@ -30,29 +164,51 @@ class VerificationService:
         }
     
     def verify_gkr_protocol(self) -> bool:
-        """验证GKR协议"""
+        """验证GKR协议，同一文件重复验证时复用进程内缓存的结果
+        
+        文件不存在或无法读取（OSError）以及CSV无法解析或包含非数值列（ValueError，
+        包括pandas和pyarrow的解析错误）时记录日志并验证失败，其他异常照常抛出
+        """
         try:
-            # 读取数据集
-            df = pd.read_csv(self.dataset.file_path)
-            
-            # 将数据转换为numpy数组
-            data = df.to_numpy()
+            return _verify_gkr(*self._file_key(), self.gkr_protocol.circuit_depth)
             
-            # 生成计算证明
-            proof = self.gkr_protocol.prove_computation(data)
-            
-            # 验证证明
-            return self.gkr_protocol.verify_computation(proof, data)
-            
-        except Exception as e:
-            print(f"GKR验证失败: {str(e)}")
+        except (OSError, ValueError) as e:
+            logger.error(f"GKR验证失败: {str(e)}")
             return False
+    
+    async def generate_zkp_proof_async(self) -> Dict[str, Any]:
+        """在线程中生成零知识证明，避免CSV读取阻塞事件循环"""
+        return await asyncio.to_thread(self.generate_zkp_proof)
+    
+    async def verify_gkr_protocol_async(self) -> bool:
+        """在线程中验证GKR协议，避免CSV读取和电路计算阻塞事件循环"""
+        return await asyncio.to_thread(self.verify_gkr_protocol)
+    
+    @classmethod
+    def batch_verify(cls, datasets: Iterable[Dataset], max_workers: int = 10) -> List[bool]:
+        """并行验证多个数据集的GKR协议，结果顺序与输入一致
+        
+        CSV解析和numpy计算会释放GIL，多个数据集的验证可以在线程中重叠执行
+        """
+        services = [cls(dataset) for dataset in datasets]
+        if not services:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(services))) as executor:
+            return list(executor.map(lambda service: service.verify_gkr_protocol(), services))
+    
+    def _file_key(self) -> Tuple[str, float, int]:
+        """数据集文件的缓存键：路径、修改时间和大小"""
+        path = self.dataset.file_path.path
+        stat = os.stat(path)
+        return path, stat.st_mtime, stat.st_size
             
-    def _generate_dataset_statement(self, df: pd.DataFrame) -> str:
-        """生成数据集描述声明"""
+    def _generate_dataset_statement(self) -> str:
+        """生成数据集描述声明，行数和列类型按文件缓存，数据集名称每次读取最新值"""
+        rows, dtypes = _dataset_summary(*self._file_key())
+        
         return f"""
         Dataset: {self.dataset.name}
-        Rows: {len(df)}
-        Columns: {list(df.columns)}
-        Types: {df.dtypes.to_dict()}
-        """ 
\ No newline at end of file
+        Rows: {rows}
+        Columns: {list(dtypes.index)}
+        Types: {dtypes.to_dict()}
+        """